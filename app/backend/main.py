@@ -1,20 +1,67 @@
 import asyncio
-import json
 import os
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Iterator, AsyncIterator, Tuple, Callable, BinaryIO
 
+import aiofiles
+import msgspec
+import orjson
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.websockets import WebSocketState
 
-from ppt_generate.agents.ppt_agent import PPTAgent
-from bs4 import BeautifulSoup
+from ppt_generate.agents.ppt_agent import PPTAgent, aclose_clients
+from ppt_generate.utils import PDFIUM_LOCK, ResponseCache
 from docx import Document
 from pptx import Presentation
 import PyPDF2
+import pypdfium2 as pdfium
+from lxml import etree
 
-app = FastAPI(title="PPT Agent Backend", version="0.1.0")
+# 设置 PPT_RESPONSE_CACHE 为 sqlite 文件路径时启用回复缓存，所有连接共享同一个缓存
+_RESPONSE_CACHE_PATH = os.getenv("PPT_RESPONSE_CACHE")
+_response_cache: Optional[ResponseCache] = (
+    ResponseCache(_RESPONSE_CACHE_PATH) if _RESPONSE_CACHE_PATH else None
+)
+
+
+def _encode_default(obj: Any) -> Any:
+    """orjson / msgspec 无法直接序列化的类型的兜底处理"""
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_encode_default)
+
+
+class _ORJSONResponse(Response):
+    """用 orjson 序列化的 JSON 响应；fastapi 自带的 ORJSONResponse 已弃用"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return _dumps(content)
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    yield
+    # 退出前关闭各连接共享的大模型客户端连接池和回复缓存
+    await aclose_clients()
+    if _response_cache is not None:
+        _response_cache.close()
+
+
+app = FastAPI(title="PPT Agent Backend",
+              version="0.1.0",
+              default_response_class=_ORJSONResponse,
+              lifespan=_lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,150 +73,363 @@ app.add_middleware(
 
 
 @app.get("/health")
-async def health() -> Dict[str, Any]:
-    return {"status": "ok"}
+async def health() -> _ORJSONResponse:
+    return _ORJSONResponse({"status": "ok"})
+
 
+# 上传文件按块写盘，避免整文件读入内存
+_UPLOAD_CHUNK_SIZE = 1 << 16
 
-def _save_upload(tmp_dir: str, uf: UploadFile) -> str:
+
+async def _save_upload(tmp_dir: str, uf: UploadFile) -> str:
     os.makedirs(tmp_dir, exist_ok=True)
     file_path = os.path.join(tmp_dir, uf.filename)
-    with open(file_path, "wb") as f:
-        f.write(uf.file.read())
+    async with aiofiles.open(file_path, "wb") as f:
+        while chunk := await uf.read(_UPLOAD_CHUNK_SIZE):
+            await f.write(chunk)
     return file_path
 
 
 @app.post("/upload")
 async def upload(file: UploadFile = File(...)):
     try:
-        saved_path = _save_upload("/tmp/ppt-agent-uploads", file)
-        return {"success": True, "path": saved_path, "filename": file.filename}
+        saved_path = await _save_upload("/tmp/ppt-agent-uploads", file)
+        return _ORJSONResponse({
+            "success": True,
+            "path": saved_path,
+            "filename": file.filename
+        })
     except Exception as e:
-        return JSONResponse(status_code=500,
-                            content={
-                                "success": False,
-                                "error": str(e)
-                            })
+        return _ORJSONResponse(status_code=500,
+                               content={
+                                   "success": False,
+                                   "error": str(e)
+                               })
 
 
-def _extract_text_from_file(path: str) -> Dict[str, Any]:
+# 读取函数逐页产出 (页码, 文本)；没有分页概念的格式页码为 None，整篇作为一项产出
+_Page = Tuple[Optional[int], str]
+
+
+def _read_text(f: BinaryIO) -> Iterator[_Page]:
+    yield None, f.read().decode("utf-8", errors="ignore")
+
+
+def _read_html(f: BinaryIO) -> Iterator[_Page]:
+    # 只取文本时直接用 libxml2 解析，不再构建 BeautifulSoup 对象树；
+    # 解析器对象不能跨线程共用，每次调用各建一个
+    parser = etree.HTMLParser(encoding="utf-8", remove_comments=True)
+    try:
+        root = etree.parse(f, parser).getroot()
+    except etree.XMLSyntaxError:
+        # 空文档
+        root = None
+    if root is None:
+        yield None, ""
+        return
+    # 与 BeautifulSoup.get_text 一致，不输出脚本和样式内容
+    etree.strip_elements(root, "script", "style", with_tail=False)
+    yield None, "\n".join(root.itertext())
+
+
+# PDFium 不是线程安全的，而抽取在多线程的线程池里运行，所有 pdfium 调用都在
+# 进程内共享的 PDFIUM_LOCK 下串行执行（与 pdf_to_text 工具共用同一把锁）
+def _read_pdf(f: BinaryIO) -> Iterator[_Page]:
     try:
-        ext = os.path.splitext(path)[1].lower()
-        if ext in [".txt", ".md", ".log"]:
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                return {"success": True, "text": f.read(), "type": ext}
-
-        if ext in [".html", ".htm"]:
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                soup = BeautifulSoup(f.read(), "html.parser")
-                return {
-                    "success": True,
-                    "text": soup.get_text("\n"),
-                    "type": ext
-                }
-
-        if ext == ".pdf":
-            with open(path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                texts = []
-                for i in range(len(reader.pages)):
-                    try:
-                        t = reader.pages[i].extract_text() or ""
-                        if t.strip():
-                            texts.append(f"=== 第 {i + 1} 页 ===\n{t}")
-                    except Exception:
-                        continue
-                return {
-                    "success": True,
-                    "text": "\n\n".join(texts),
-                    "type": ext
-                }
-
-        if ext in [".docx"]:
-            doc = Document(path)
-            paragraphs = [
-                p.text for p in doc.paragraphs if p.text and p.text.strip()
-            ]
-            return {
-                "success": True,
-                "text": "\n".join(paragraphs),
-                "type": ext
-            }
-
-        if ext in [".pptx"]:
-            prs = Presentation(path)
-            texts = []
-            for slide_idx, slide in enumerate(prs.slides, start=1):
-                slide_text = []
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text:
-                        slide_text.append(shape.text)
-                if slide_text:
-                    texts.append(f"=== 第 {slide_idx} 页 ===\n" +
-                                 "\n".join(slide_text))
-            return {"success": True, "text": "\n\n".join(texts), "type": ext}
+        with PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(f)
+    except pdfium.PdfiumError:
+        # PDFium 打不开的文件再交给纯 Python 的 PyPDF2 试一次
+        f.seek(0)
+        yield from _read_pdf_fallback(f)
+        return
+    try:
+        with PDFIUM_LOCK:
+            n_pages = len(pdf)
+        for i in range(n_pages):
+            t = _read_pdf_page(pdf, i)
+            if t and t.strip():
+                yield i + 1, t
+    finally:
+        with PDFIUM_LOCK:
+            pdf.close()
 
+
+def _read_pdf_page(pdf: "pdfium.PdfDocument", i: int) -> Optional[str]:
+    # 每次只在锁内读一页，锁不会跨 yield 持有，多个文档可以交替推进
+    with PDFIUM_LOCK:
+        try:
+            page = pdf[i]
+        except pdfium.PdfiumError:
+            return None
+        try:
+            textpage = page.get_textpage()
+            try:
+                return textpage.get_text_range().replace("\r\n", "\n")
+            finally:
+                textpage.close()
+        except pdfium.PdfiumError:
+            return None
+        finally:
+            page.close()
+
+
+def _read_pdf_fallback(f: BinaryIO) -> Iterator[_Page]:
+    reader = PyPDF2.PdfReader(f)
+    for i in range(len(reader.pages)):
+        try:
+            t = reader.pages[i].extract_text() or ""
+        except Exception:
+            continue
+        if t.strip():
+            yield i + 1, t
+
+
+def _read_docx(f: BinaryIO) -> Iterator[_Page]:
+    doc = Document(f)
+    paragraphs = [p.text for p in doc.paragraphs if p.text and p.text.strip()]
+    yield None, "\n".join(paragraphs)
+
+
+def _read_pptx(f: BinaryIO) -> Iterator[_Page]:
+    prs = Presentation(f)
+    for slide_idx, slide in enumerate(prs.slides, start=1):
+        slide_text = []
+        for shape in slide.shapes:
+            if hasattr(shape, "text") and shape.text:
+                slide_text.append(shape.text)
+        if slide_text:
+            yield slide_idx, "\n".join(slide_text)
+
+
+# 文件扩展名到读取函数的映射，新增格式只需在这里登记
+_READERS: Dict[str, Callable[[BinaryIO], Iterator[_Page]]] = {
+    ".txt": _read_text,
+    ".md": _read_text,
+    ".log": _read_text,
+    ".html": _read_html,
+    ".htm": _read_html,
+    ".pdf": _read_pdf,
+    ".docx": _read_docx,
+    ".pptx": _read_pptx,
+}
+
+
+def _read_file(f: BinaryIO,
+               reader: Callable[[BinaryIO], Iterator[_Page]]) -> Iterator[_Page]:
+    with f:
+        yield from reader(f)
+
+
+def _iter_pages(path: str) -> Tuple[str, Iterator[_Page]]:
+    """按文件类型返回 (类型, 逐页 (页码, 文本) 迭代器)。
+
+    文件在这里以只读方式打开一次，不存在时直接抛出 FileNotFoundError，
+    各读取函数只接收已打开的文件对象，解析则推迟到迭代时进行。
+    """
+    ext = os.path.splitext(path)[1].lower()
+    f = open(path, "rb")
+    reader = _READERS.get(ext)
+    if reader is None:
         # 未知类型，按文本尝试
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            return {
-                "success": True,
-                "text": f.read(),
-                "type": ext or "unknown"
-            }
+        return ext or "unknown", _read_file(f, _read_text)
+    return ext, _read_file(f, reader)
+
+
+def _extract_text_from_file(path: str) -> Dict[str, Any]:
+    try:
+        ext, pages = _iter_pages(path)
+        text = "\n\n".join(
+            t if n is None else f"=== 第 {n} 页 ===\n{t}" for n, t in pages)
+        return {"success": True, "text": text, "type": ext}
     except Exception as e:
         return {"success": False, "error": str(e), "text": ""}
 
 
+# 文件解析是同步且偏 CPU 的调用，放在独立的线程池中执行，
+# 并发上传时不会占满默认线程池，也不会和其他 to_thread 调用互相排队。
+# 多个 PDF 在这里并发解析时，pdfium 调用仍由 PDFIUM_LOCK 串行化
+_extract_executor = ThreadPoolExecutor(max_workers=os.cpu_count(),
+                                       thread_name_prefix="extract")
+
+
+async def _run_extract(fn: Callable[..., Any], *args: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_extract_executor, fn, *args)
+
+
+# 页迭代器耗尽的哨兵
+_EXHAUSTED = object()
+
+
+async def _stream_extract(ext: str, pages: Iterator[_Page],
+                          first: Any) -> AsyncIterator[bytes]:
+    """逐页输出 {"type", "pages": [{"page", "text"}, ...], "success"} 形式的 JSON，
+    page 为文档中的真实页码（没有分页的格式为 null），text 不带页眉。
+    每一页都在线程池中解析，内存占用只与单页大小相关。success 放在最后输出，
+    中途解析失败时以 "success": false 和 "error" 结束，已输出的页仍然保留"""
+    future = None
+    try:
+        yield b'{"type":' + orjson.dumps(ext) + b',"pages":['
+        sep = b""
+        page = first
+        try:
+            while page is not _EXHAUSTED:
+                page_no, text = page
+                yield sep + orjson.dumps({"page": page_no, "text": text})
+                sep = b","
+                future = _extract_executor.submit(next, pages, _EXHAUSTED)
+                page = await asyncio.wrap_future(future)
+        except Exception as e:
+            yield b'],"success":false,"error":' + orjson.dumps(str(e)) + b"}"
+            return
+        yield b'],"success":true}'
+    finally:
+        # 客户端断开时工作线程可能还在读取当前页，不能在读取中途关闭生成器和文件，
+        # 等这一页读完后由该线程关闭
+        if future is not None and not future.done():
+            future.add_done_callback(lambda _: pages.close())
+        else:
+            pages.close()
+
+
 @app.post("/extract")
 async def extract(path: str = Form(...)):
-    if not os.path.exists(path):
-        return JSONResponse(status_code=404,
-                            content={
-                                "success": False,
-                                "error": "file not found"
-                            })
-    result = _extract_text_from_file(path)
-    if not result.get("success"):
-        return JSONResponse(status_code=500, content=result)
-    return result
+    # 先解析出第一页再开始流式返回，文件不存在返回 404，打开/解析失败时仍能返回 500
+    try:
+        ext, pages = _iter_pages(path)
+        first = await _run_extract(next, pages, _EXHAUSTED)
+    except FileNotFoundError:
+        return _ORJSONResponse(status_code=404,
+                               content={
+                                   "success": False,
+                                   "error": "file not found"
+                               })
+    except Exception as e:
+        return _ORJSONResponse(status_code=500,
+                               content={
+                                   "success": False,
+                                   "error": str(e),
+                                   "text": ""
+                               })
+    return StreamingResponse(_stream_extract(ext, pages, first),
+                             media_type="application/json")
+
+
+class GenerateRequest(msgspec.Struct):
+    """/ws/generate 上客户端发来的请求，未带 action 时按老协议一次性执行"""
+
+    action: Optional[str] = None
+    query: str = ""
+    reference_content: Optional[str] = None
+    reference_path: Optional[str] = None
+    outline: str = ""
+    rethink: bool = True
+    max_rethink_times: int = 3
+    # 是否让模型输出思考过程，默认关闭以减少生成的 token 数和首字延迟
+    enable_thinking: bool = False
+
+
+_request_decoder = msgspec.json.Decoder(GenerateRequest)
+# 客户端通过 websocket 子协议 "msgpack" 协商使用 MessagePack 二进制帧，默认仍为 JSON
+_request_msgpack_decoder = msgspec.msgpack.Decoder(GenerateRequest)
+_msgpack_encoder = msgspec.msgpack.Encoder(enc_hook=_encode_default)
+
+_CONNECTED = WebSocketState.CONNECTED
+
+# websocket 单帧最多合并的事件数、断开前等待剩余事件发送的时长（秒）
+_EVENT_BATCH_SIZE = 64
+_EVENT_FLUSH_TIMEOUT = 5.0
+# token 事件最多攒多久（秒）再发送，状态切换类事件不等待
+_EVENT_LINGER = 0.05
+# 积压的事件达到高水位时暂停读取大模型的流，发送到低水位以下再继续
+_EVENT_HIGH_WATER = 1024
+_EVENT_LOW_WATER = 256
 
 
 @app.websocket("/ws/generate")
 async def ws_generate(websocket: WebSocket):
-    await websocket.accept()
-
-    agent: Optional[PPTAgent] = PPTAgent()
+    use_msgpack = "msgpack" in websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol="msgpack" if use_msgpack else None)
+    encode = _msgpack_encoder.encode if use_msgpack else _dumps
+    decoder = _request_msgpack_decoder if use_msgpack else _request_decoder
 
-    async def _send_json_safe(payload: Dict[str, Any]):
+    async def _send_safe(payload: Any):
         try:
-            if websocket.client_state != WebSocketState.CONNECTED:
+            if websocket.client_state is not _CONNECTED:
                 return
-            await websocket.send_text(json.dumps(payload))
+            await websocket.send_bytes(encode(payload))
         except Exception:
             pass
 
+    # 所有事件经由同一个队列按顺序发送，每次把已积压的事件合并成一帧数组。
+    # 连续的 token 事件最多等待 _EVENT_LINGER 秒凑成一帧，遇到非 token 事件
+    # （start/end/done 等状态切换）立即发送，保证界面状态及时更新。
+    # 丢弃任何事件都会让前端状态错乱，所以队列本身不设上限；客户端消费过慢、
+    # 积压达到高水位时，智能体在读取下一段流式输出前等待（见 _wait_writable），
+    # 积压的事件数因此有上限
+    queue: asyncio.Queue = asyncio.Queue()
+    writable = asyncio.Event()
+    writable.set()
+    loop = asyncio.get_running_loop()
+
+    async def _drain():
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + _EVENT_LINGER
+            while (len(batch) < _EVENT_BATCH_SIZE
+                   and batch[-1].get("type") == "token"):
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await _send_safe(batch)
+            for _ in batch:
+                queue.task_done()
+            if queue.qsize() <= _EVENT_LOW_WATER:
+                writable.set()
+
     def on_event(evt: Dict[str, Any]):
-        asyncio.create_task(_send_json_safe(evt))
+        queue.put_nowait(evt)
+        if queue.qsize() >= _EVENT_HIGH_WATER:
+            writable.clear()
+
+    async def _wait_writable():
+        await writable.wait()
+
+    agent: Optional[PPTAgent] = PPTAgent(response_cache=_response_cache,
+                                         backpressure=_wait_writable)
+
+    sender = asyncio.create_task(_drain())
 
     try:
         while True:
-            msg = await websocket.receive_text()
-            data = json.loads(msg)
-            action = data.get("action")
+            if use_msgpack:
+                msg = await websocket.receive_bytes()
+            else:
+                msg = await websocket.receive_text()
+            req = decoder.decode(msg)
+            action = req.action
+            agent.enable_thinking = req.enable_thinking
 
             # 兼容老协议：未带 action 的一次性执行
             if not action:
-                query: str = data.get("query", "")
-                reference_content: Optional[str] = data.get(
-                    "reference_content")
-                reference_path = data.get("reference_path")
-                rethink: bool = bool(data.get("rethink", True))
-                max_rethink_times: int = int(data.get("max_rethink_times", 3))
+                query = req.query
+                reference_content = req.reference_content
+                reference_path = req.reference_path
 
                 if reference_path and not reference_content:
-                    ext_result = _extract_text_from_file(reference_path)
+                    ext_result = await _run_extract(
+                        _extract_text_from_file, reference_path)
                     if ext_result.get("success"):
                         reference_content = ext_result.get("text")
-                        await _send_json_safe({
+                        on_event({
                             "stage":
                             "reference_loaded",
                             "type":
@@ -184,11 +444,11 @@ async def ws_generate(websocket: WebSocket):
                     on_event=on_event)
                 await agent.generate_page_content(
                     outline=agent.ppt_info["outline"],
-                    rethink=rethink,
-                    max_rethink_times=max_rethink_times,
+                    rethink=req.rethink,
+                    max_rethink_times=req.max_rethink_times,
                     on_event=on_event,
                 )
-                await _send_json_safe({
+                on_event({
                     "stage": "done",
                     "outline": agent.ppt_info.get("outline"),
                     "pages": agent.ppt_info.get("pages", []),
@@ -196,16 +456,16 @@ async def ws_generate(websocket: WebSocket):
                 continue
 
             if action == "start_outline":
-                query: str = data.get("query", "")
-                reference_content: Optional[str] = data.get(
-                    "reference_content")
-                reference_path = data.get("reference_path")
+                query = req.query
+                reference_content = req.reference_content
+                reference_path = req.reference_path
 
                 if reference_path and not reference_content:
-                    ext_result = _extract_text_from_file(reference_path)
+                    ext_result = await _run_extract(
+                        _extract_text_from_file, reference_path)
                     if ext_result.get("success"):
                         reference_content = ext_result.get("text")
-                        await _send_json_safe({
+                        on_event({
                             "stage":
                             "reference_loaded",
                             "type":
@@ -222,11 +482,9 @@ async def ws_generate(websocket: WebSocket):
                 continue
 
             if action == "start_content":
-                outline: str = data.get("outline", "")
-                rethink: bool = bool(data.get("rethink", True))
-                max_rethink_times: int = int(data.get("max_rethink_times", 3))
+                outline = req.outline
                 if not outline:
-                    await _send_json_safe({
+                    on_event({
                         "stage": "error",
                         "error": "outline is required"
                     })
@@ -235,17 +493,17 @@ async def ws_generate(websocket: WebSocket):
                 agent.ppt_info["outline"] = outline
                 await agent.generate_page_content(
                     outline=outline,
-                    rethink=rethink,
-                    max_rethink_times=max_rethink_times,
+                    rethink=req.rethink,
+                    max_rethink_times=req.max_rethink_times,
                     on_event=on_event)
-                await _send_json_safe({
+                on_event({
                     "stage": "done",
                     "outline": agent.ppt_info.get("outline"),
                     "pages": agent.ppt_info.get("pages", []),
                 })
                 continue
 
-            await _send_json_safe({
+            on_event({
                 "stage": "error",
                 "error": f"unknown action: {action}"
             })
@@ -253,11 +511,14 @@ async def ws_generate(websocket: WebSocket):
     except WebSocketDisconnect:
         pass
     except Exception as e:
+        on_event({"stage": "error", "error": str(e)})
+    finally:
+        # 先把队列里剩余的事件发完再关闭连接
         try:
-            await _send_json_safe({"stage": "error", "error": str(e)})
-        except Exception:
+            await asyncio.wait_for(queue.join(), timeout=_EVENT_FLUSH_TIMEOUT)
+        except asyncio.TimeoutError:
             pass
-    finally:
+        sender.cancel()
         try:
             await websocket.close()
         except Exception:
@@ -267,4 +528,17 @@ async def ws_generate(websocket: WebSocket):
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # 默认开发模式热重载，只能单进程；PPT_AGENT_RELOAD=0 时按 CPU 核数启动多个 worker
+    reload = os.getenv("PPT_AGENT_RELOAD", "1") == "1"
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=reload,
+        workers=1 if reload else os.cpu_count(),
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        # 访问日志每个请求都要格式化一行，只在开发（reload）模式下保留
+        access_log=reload,
+    )
@@ -9,6 +9,7 @@ type RethinkRound = {
 
 const BACKEND_HTTP = (import.meta as any).env?.VITE_BACKEND_URL || 'http://localhost:8000'
 const BACKEND_WS = BACKEND_HTTP.replace('http', 'ws')
+const frameDecoder = new TextDecoder()
 
 function sanitizeTags(s: string): string {
   if (!s) return ''
@@ -56,11 +57,38 @@ type PageCard = {
   raw: string
 }
 
+function parsePageCard(p: string): PageCard {
+  const raw = p.trim()
+  try {
+    const obj = JSON.parse(raw)
+    const b = obj.body
+    return {
+      pageNum: String(obj.page_num || obj.pageNum || ''),
+      title: String(obj.title || ''),
+      summary: String(obj.summary || ''),
+      body: typeof b === 'string' ? b : JSON.stringify(b || {}),
+      advice: String(obj.img_table_advice || obj.imgTableAdvice || ''),
+      raw,
+    }
+  } catch (e) {
+    // 兼容旧格式（标签）
+    return {
+      pageNum: sanitizeTags(pickBetween(raw, 'page_num')),
+      title: sanitizeTags(pickBetween(raw, 'title')),
+      summary: sanitizeTags(pickBetween(raw, 'summary')),
+      body: sanitizeTags(pickBetween(raw, 'body')),
+      advice: sanitizeTags(pickBetween(raw, 'img_table_advice')),
+      raw,
+    }
+  }
+}
+
 export default function App() {
   const [query, setQuery] = useState('请为“企业私有化大模型平台建设方案”生成一个结构完整、逻辑严密且内容详尽的PPT，约12-20页')
   const [referenceText, setReferenceText] = useState('')
   const [uploaded, setUploaded] = useState<{ path: string; filename: string } | null>(null)
   const [rethink, setRethink] = useState(true)
+  const [enableThinking, setEnableThinking] = useState(false)
   const [maxRounds, setMaxRounds] = useState(3)
 
   const [connecting, setConnecting] = useState(false)
@@ -115,7 +143,9 @@ export default function App() {
       ext.append('path', data.path)
       const er = await fetch(`${BACKEND_HTTP}/extract`, { method: 'POST', body: ext })
       const ed = await er.json()
-      if (ed.success) setReferenceText(ed.text)
+      // 服务端逐页流式返回 {type, pages: [{page, text}], success}，page 为真实页码，没有分页的格式为 null
+      if (ed.success) setReferenceText((ed.pages || []).map((p: { page: number | null, text: string }) =>
+        p.page == null ? p.text : `=== 第 ${p.page} 页 ===\n${p.text}`).join('\n\n'))
     }
   }
 
@@ -126,9 +156,10 @@ export default function App() {
     setConnecting(true)
     const ws = new WebSocket(`${BACKEND_WS}/ws/generate`)
     wsRef.current = ws
+    // 服务端以二进制帧发送 UTF-8 编码的 JSON
+    ws.binaryType = 'arraybuffer'
     ws.onopen = () => setConnecting(false)
-    ws.onmessage = (ev) => {
-      const evt = JSON.parse(ev.data)
+    const handleEvent = (evt: any) => {
       const stage = evt.stage as string
       const type = evt.type as string | undefined
 
@@ -172,46 +203,16 @@ export default function App() {
           setContentAnswer('')
           setCollapsed((c) => ({ ...c, preview_col: false }))
         } else if (type === 'token') {
-          // 累加原始文本并实时解析 <page> 块形成卡片（JSON 格式）
-          setContentAnswer((prev) => {
-            const next = prev + (evt.text || '')
-            const re = /<page>([\s\S]*?)<\/page>/g
-            const found: PageCard[] = []
-            let m: RegExpExecArray | null
-            while ((m = re.exec(next)) !== null) {
-              const raw = m[1].trim()
-              let pageNum = ''
-              let title = ''
-              let summary = ''
-              let body = ''
-              let advice = ''
-              try {
-                const obj = JSON.parse(raw)
-                pageNum = String(obj.page_num || obj.pageNum || '')
-                title = String(obj.title || '')
-                summary = String(obj.summary || '')
-                const b = obj.body
-                body = typeof b === 'string' ? b : JSON.stringify(b || {})
-                advice = String(obj.img_table_advice || obj.imgTableAdvice || '')
-              } catch (e) {
-                // 兼容旧格式（标签）
-                pageNum = pickBetween(raw, 'page_num')
-                title = pickBetween(raw, 'title')
-                summary = pickBetween(raw, 'summary')
-                body = pickBetween(raw, 'body')
-                advice = pickBetween(raw, 'img_table_advice')
-              }
-              found.push({ pageNum, title, summary, body, advice, raw })
-            }
-            setPageCards((old) => {
-              if (found.length > old.length) {
-                return found
-              }
-              return old
-            })
-            return next
-          })
+          setContentAnswer((prev) => prev + (evt.text || ''))
         }
+      } else if (stage === 'content_page') {
+        // 服务端每解析出一个完整的 <page> 块就单独推送一次，直接追加成卡片
+        const card = parsePageCard(evt.page || '')
+        setPageCards((old) => {
+          const next = old.slice(0, evt.index)
+          next[evt.index] = card
+          return next
+        })
       } else if (stage === 'rethinking_think' || stage === 'rethinking_answer' || stage === 'modify_answer') {
         const round = evt.round as number
         setRethinks((arr) => {
@@ -276,30 +277,7 @@ export default function App() {
         const arr: string[] = evt.pages || []
         setPages(arr)
         // 最终同步一次卡片（JSON 格式）
-        const cards: PageCard[] = arr.map((p) => {
-          const raw = p.trim()
-          try {
-            const obj = JSON.parse(raw)
-            const b = obj.body
-            return {
-              pageNum: String(obj.page_num || obj.pageNum || ''),
-              title: String(obj.title || ''),
-              summary: String(obj.summary || ''),
-              body: typeof b === 'string' ? b : JSON.stringify(b || {}),
-              advice: String(obj.img_table_advice || obj.imgTableAdvice || ''),
-              raw,
-            }
-          } catch (e) {
-            return {
-              pageNum: sanitizeTags(pickBetween(raw, 'page_num')),
-              title: sanitizeTags(pickBetween(raw, 'title')),
-              summary: sanitizeTags(pickBetween(raw, 'summary')),
-              body: sanitizeTags(pickBetween(raw, 'body')),
-              advice: sanitizeTags(pickBetween(raw, 'img_table_advice')),
-              raw,
-            }
-          }
-        })
+        const cards: PageCard[] = arr.map(parsePageCard)
         setPageCards(cards)
       } else if (stage === 'done') {
         const arr: string[] = evt.pages || []
@@ -313,6 +291,11 @@ export default function App() {
         setConnecting(false)
       }
     }
+    ws.onmessage = (ev) => {
+      // 服务端会把积压的事件合并成一个 JSON 数组帧发送
+      const data = JSON.parse(typeof ev.data === 'string' ? ev.data : frameDecoder.decode(ev.data))
+      for (const evt of Array.isArray(data) ? data : [data]) handleEvent(evt)
+    }
     ws.onclose = () => setConnecting(false)
   }, [])
 
@@ -325,9 +308,10 @@ export default function App() {
         query,
         reference_content: referenceText || undefined,
         reference_path: uploaded?.path || undefined,
+        enable_thinking: enableThinking,
       }),
     )
-  }, [ensureConnection, query, referenceText, uploaded])
+  }, [ensureConnection, query, referenceText, uploaded, enableThinking])
 
   const onCreationClick = useCallback(async () => {
     if (!creationPrimed) {
@@ -347,9 +331,10 @@ export default function App() {
         outline: outlineForConfirm,
         rethink,
         max_rethink_times: maxRounds,
+        enable_thinking: enableThinking,
       }),
     )
-  }, [ensureConnection, outlineForConfirm, rethink, maxRounds])
+  }, [ensureConnection, outlineForConfirm, rethink, maxRounds, enableThinking])
 
   const pageGrid = useMemo(() => {
     return pageCards.map((p, i) => {
@@ -458,6 +443,11 @@ export default function App() {
               />
               <span className="text-slate-400 text-sm">最大轮数</span>
             </div>
+            <label className="inline-flex items-center gap-2">
+              <input type="checkbox" checked={enableThinking} onChange={(e) => setEnableThinking(e.target.checked)} />
+              <span>显示思考过程</span>
+              <span className="text-slate-400 text-sm">（关闭后更快、更省 token）</span>
+            </label>
             <div className="flex gap-2">
               <label className="glass px-3 py-2 cursor-pointer">
                 <input
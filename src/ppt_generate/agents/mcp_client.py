@@ -1,28 +1,108 @@
-from mcp.client.streamable_http import streamablehttp_client
-from mcp import ClientSession
-from typing import Optional, Dict, List, Any, Literal
-from openai import AsyncOpenAI
-import os
-import json
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Optional,
+    Dict,
+    List,
+    Any,
+    Callable,
+    Awaitable,
+)
+from functools import partial
+import orjson
 import asyncio
+import httpx
+import logging
+import weakref
+
+if TYPE_CHECKING:
+    from mcp import ClientSession
+
+logger = logging.getLogger(__name__)
+
+
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """所有服务器连接共用的连接池。streamablehttp_client 断开时会关闭自己的
+    httpx 客户端，这里忽略 aclose，使连接池在多次连接/重连之间保持复用"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+    async def aclose_pool(self) -> None:
+        """真正关闭底层连接池"""
+        await self._transport.aclose()
+
+
+_shared_transport: Optional[_SharedTransport] = None
+# 正在使用共享连接池的 MCPClient，最后一个断开全部连接时关闭连接池
+_active_clients: "weakref.WeakSet[MCPClient]" = weakref.WeakSet()
+
+
+def _shared_http_client(
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[httpx.Timeout] = None,
+    auth: Optional[httpx.Auth] = None,
+) -> httpx.AsyncClient:
+    """streamablehttp_client 的 httpx_client_factory：同一主机上的多个MCP服务器复用TCP/TLS连接"""
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = _SharedTransport(
+            httpx.AsyncHTTPTransport(
+                retries=0,
+                limits=httpx.Limits(max_connections=128, max_keepalive_connections=64),
+            )
+        )
+    return httpx.AsyncClient(
+        transport=_shared_transport,
+        headers=headers,
+        timeout=timeout if timeout is not None else httpx.Timeout(30.0),
+        auth=auth,
+        follow_redirects=True,
+    )
+
+
+async def aclose_shared_http_client() -> None:
+    """关闭所有MCP服务器连接共用的连接池，之后再连接时会重新创建"""
+    global _shared_transport
+    transport, _shared_transport = _shared_transport, None
+    if transport is not None:
+        await transport.aclose_pool()
 
 
 class ServerConnection:
     """单个MCP服务器连接的封装类"""
 
-    def __init__(self, name: str, url: str):
+    def __init__(self, name: str, url: str, priority: int = 0):
         self.name = name
         self.url = url
+        # 优先级越高，批量连接时越先发起
+        self.priority = priority
         self.session: Optional[ClientSession] = None
         self._streams_context = None
         self._session_context = None
         self.is_connected = False
+        # 工具列表在一次连接内基本不变，首次获取后缓存，断开/重连时清空
+        self._tools_cache: Optional[List[Any]] = None
 
     async def connect(self):
         """连接到MCP服务器"""
+        # mcp依赖较重（pydantic、anyio等），第一次真正连接时才导入
+        from mcp import ClientSession
+        from mcp.client.streamable_http import streamablehttp_client
+
+        self._tools_cache = None
         try:
             # 创建 HTTP 流式传输客户端上下文
-            self._streams_context = streamablehttp_client(url=self.url)
+            self._streams_context = streamablehttp_client(
+                url=self.url, httpx_client_factory=_shared_http_client
+            )
 
             # 异步进入流上下文管理器，获取读写流
             read_stream, write_stream, _ = await self._streams_context.__aenter__()
@@ -37,10 +117,10 @@ class ServerConnection:
             await self.session.initialize()
 
             self.is_connected = True
-            print(f"✅ 成功连接到服务器: {self.name} ({self.url})")
+            logger.info("✅ 成功连接到服务器: %s (%s)", self.name, self.url)
 
         except Exception as e:
-            print(f"❌ 连接服务器 {self.name} 失败: {str(e)}")
+            logger.error("❌ 连接服务器 %s 失败: %s", self.name, e)
             self.is_connected = False
             raise
 
@@ -53,18 +133,33 @@ class ServerConnection:
                 await self._streams_context.__aexit__(None, None, None)
 
             self.is_connected = False
-            print(f"🔌 已断开服务器连接: {self.name}")
+            logger.info("🔌 已断开服务器连接: %s", self.name)
 
         except Exception as e:
-            print(f"⚠️ 断开服务器 {self.name} 连接时出错: {str(e)}")
+            logger.warning("⚠️ 断开服务器 %s 连接时出错: %s", self.name, e)
+        finally:
+            self._tools_cache = None
+
+    def invalidate_tools(self) -> None:
+        """清空工具列表缓存，下次get_tools时重新向服务器获取"""
+        self._tools_cache = None
+
+    async def get_tools(self, refresh: bool = False) -> List[Any]:
+        """获取该服务器提供的工具列表
+
+        Args:
+            refresh (bool, optional): 是否跳过缓存重新向服务器获取，健康检查时需要真正访问服务器。默认值为False。
 
-    async def get_tools(self) -> List[Any]:
-        """获取该服务器提供的工具列表"""
+        Returns:
+            List[Any]: 工具列表
+        """
         if not self.is_connected or not self.session:
             raise RuntimeError(f"服务器 {self.name} 未连接")
 
-        response = await self.session.list_tools()
-        return response.tools
+        if refresh or self._tools_cache is None:
+            response = await self.session.list_tools()
+            self._tools_cache = response.tools
+        return self._tools_cache
 
     async def call_tool(self, tool_name: str, tool_args: dict) -> Any:
         """调用该服务器的工具
@@ -87,68 +182,144 @@ class MCPClient:
     智能体需要集成这个类来写代码，必须实现run_agent方法
     """
 
-    def add_server(self, name: str, url: str) -> None:
-        """添加一个MCP服务器"""
+    def __init__(self, max_parallel_connects: int = 16) -> None:
+        self.servers: Dict[str, ServerConnection] = {}
+        # 批量连接/断开时同时进行的最大数量，避免服务器很多时一次性占满事件循环和文件描述符
+        self.max_parallel_connects: int = max_parallel_connects
+        # 工具名 -> 服务器名的索引，服务器增删或连接状态变化时置为None，下次查找时重建
+        self._tool_index: Optional[Dict[str, str]] = None
+        # OpenAI格式的工具列表，与工具索引同时失效
+        self._openai_tools_cache: Optional[List[Dict[str, Any]]] = None
+        # 工具名 -> 已绑定服务器和工具名的call_tool，随工具索引一起重建
+        self._dispatch: Optional[Dict[str, Callable[[dict], Awaitable[Any]]]] = None
+
+    def _invalidate_tool_index(self) -> None:
+        """服务器集合或连接状态变化后，丢弃工具索引、调度表和OpenAI格式的工具列表"""
+        self._tool_index = None
+        self._dispatch = None
+        self._openai_tools_cache = None
+
+    async def _gather_bounded(
+        self, coros: List[Any], timeout: Optional[float] = None
+    ) -> None:
+        """以max_parallel_connects为上限并发执行协程，单个协程的异常不影响其他协程
+
+        Args:
+            coros (List[Any]): 要执行的协程
+            timeout (Optional[float], optional): 整体最长等待秒数，超时后取消仍未完成的协程。默认值为None，一直等待。
+        """
+        if not coros:
+            return
+        sem = asyncio.Semaphore(self.max_parallel_connects)
+
+        async def _guarded(coro):
+            async with sem:
+                return await coro
+
+        tasks = [asyncio.create_task(_guarded(coro)) for coro in coros]
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logger.warning("⚠️ %d 个任务超时未完成，已取消", len(pending))
+            for task in pending:
+                task.cancel()
+        # 取走异常，避免出现 "Task exception was never retrieved"
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def add_server(self, name: str, url: str, priority: int = 0) -> None:
+        """添加一个MCP服务器
+
+        Args:
+            name (str): 服务器名称
+            url (str): 服务器地址
+            priority (int, optional): 优先级，越高越先连接。默认值为0。
+        """
         if name in self.servers:
-            print(f"⚠️ 服务器 {name} 已存在，将被替换")
+            logger.warning("⚠️ 服务器 %s 已存在，将被替换", name)
 
-        self.servers[name] = ServerConnection(name, url)
-        print(f"📝 已添加服务器: {name} ({url})")
+        self.servers[name] = ServerConnection(name, url, priority)
+        self._invalidate_tool_index()
+        logger.debug("📝 已添加服务器: %s (%s)", name, url)
 
     def remove_server(self, name: str) -> None:
         """移除一个MCP服务器"""
         if name in self.servers:
             del self.servers[name]
-            print(f"🗑️ 已移除服务器: {name}")
+            self._invalidate_tool_index()
+            logger.debug("🗑️ 已移除服务器: %s", name)
         else:
-            print(f"⚠️ 服务器 {name} 不存在")
+            logger.warning("⚠️ 服务器 %s 不存在", name)
 
     async def connect_server(self, name: str):
         """连接指定的服务器"""
         if name not in self.servers:
-            print(f"⚠️ 服务器 {name} 不存在")
+            logger.warning("⚠️ 服务器 %s 不存在", name)
             return False
 
+        _active_clients.add(self)
         try:
             await self.servers[name].connect()
             return True
         except Exception:
             return False
+        finally:
+            self._invalidate_tool_index()
 
     async def connect_all_servers(self):
         """连接所有已添加的服务器"""
         if not self.servers:
-            print("⚠️ 没有可连接的服务器")
+            logger.warning("⚠️ 没有可连接的服务器")
             return
 
-        print(f"🔄 开始连接 {len(self.servers)} 个服务器...")
-
-        # 并发连接所有服务器
-        tasks = [server.connect() for server in self.servers.values()]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("🔄 开始连接 %d 个服务器...", len(self.servers))
 
-        # 统计连接结果
-        connected_count = sum(
-            1 for server in self.servers.values() if server.is_connected
+        # 并发连接所有服务器（限制同时进行的数量），按优先级从高到低发起，
+        # 信号量按先来先得放行，核心服务会先连上
+        servers = sorted(
+            self.servers.values(), key=lambda s: s.priority, reverse=True
         )
-        print(f"📊 连接完成: {connected_count}/{len(self.servers)} 个服务器连接成功")
+        _active_clients.add(self)
+        await self._gather_bounded([server.connect() for server in servers])
+        self._invalidate_tool_index()
+
+        # 统计连接结果，日志级别不输出时不必遍历
+        if logger.isEnabledFor(logging.INFO):
+            connected_count = sum(
+                1 for server in self.servers.values() if server.is_connected
+            )
+            logger.info(
+                "📊 连接完成: %d/%d 个服务器连接成功", connected_count, len(self.servers)
+            )
 
     async def disconnect_server(self, name: str):
         """断开指定服务器的连接"""
         if name not in self.servers:
-            print(f"⚠️ 服务器 {name} 不存在")
+            logger.warning("⚠️ 服务器 %s 不存在", name)
             return
 
         await self.servers[name].disconnect()
+        self._invalidate_tool_index()
 
-    async def disconnect_all_servers(self):
-        """断开所有服务器连接"""
-        print("🔌 正在断开所有服务器连接...")
+    async def disconnect_all_servers(self, timeout: float = 5.0):
+        """断开所有服务器连接
 
-        tasks = [server.disconnect() for server in self.servers.values()]
-        await asyncio.gather(*tasks, return_exceptions=True)
+        Args:
+            timeout (float, optional): 最长等待秒数，远端无响应时不会让清理一直挂起。默认值为5.0。
+        """
+        logger.info("🔌 正在断开所有服务器连接...")
 
-        print("✅ 所有服务器连接已断开")
+        await self._gather_bounded(
+            [server.disconnect() for server in self.servers.values()], timeout=timeout
+        )
+        # 超时被取消的连接也视为已断开
+        for server in self.servers.values():
+            server.is_connected = False
+        self._invalidate_tool_index()
+        # 没有其他客户端在用共享连接池时一并关闭，避免连接池存活到解释器退出
+        _active_clients.discard(self)
+        if not _active_clients:
+            await aclose_shared_http_client()
+
+        logger.info("✅ 所有服务器连接已断开")
 
     def get_connected_servers(self) -> List[str]:
         """获取已连接的服务器列表"""
@@ -156,21 +327,62 @@ class MCPClient:
 
     async def get_all_tools(self) -> Dict[str, List[Any]]:
         """获取所有已连接服务器的工具"""
-        all_tools = {}
-
-        for name, server in self.servers.items():
-            if server.is_connected:
-                try:
-                    tools = await server.get_tools()
-                    all_tools[name] = tools
-                except Exception as e:
-                    print(f"⚠️ 获取服务器 {name} 的工具失败: {str(e)}")
-                    all_tools[name] = []
+        all_tools = {name: [] for name in self.servers}
+
+        # 并发获取所有已连接服务器的工具，耗时取决于最慢的一个而不是总和
+        connected = [
+            (name, server)
+            for name, server in self.servers.items()
+            if server.is_connected
+        ]
+        results = await asyncio.gather(
+            *(server.get_tools() for _, server in connected), return_exceptions=True
+        )
+        for (name, _), result in zip(connected, results):
+            if isinstance(result, Exception):
+                logger.warning("⚠️ 获取服务器 %s 的工具失败: %s", name, result)
             else:
-                all_tools[name] = []
+                all_tools[name] = result
 
+        self._tool_index = self._build_tool_index(all_tools)
+        self._dispatch = None
         return all_tools
 
+    @staticmethod
+    def _build_tool_index(all_tools: Dict[str, List[Any]]) -> Dict[str, str]:
+        """把各服务器的工具列表展开成 工具名 -> 服务器名 的索引"""
+        return {
+            tool.name: server_name
+            for server_name, tools in all_tools.items()
+            for tool in tools
+        }
+
+    def _build_openai_tools(
+        self, all_tools: Dict[str, List[Any]]
+    ) -> List[Dict[str, Any]]:
+        """把所有服务器的工具合并为OpenAI格式，结果缓存到服务器集合或连接状态变化为止
+
+        Args:
+            all_tools (Dict[str, List[Any]]): 所有服务器的工具列表
+
+        Returns:
+            List[Dict[str, Any]]: 可直接传给tools参数的工具列表
+        """
+        if self._openai_tools_cache is None:
+            self._openai_tools_cache = [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool.name,
+                        "description": f"[{server_name}] {tool.description}",
+                        "parameters": tool.inputSchema,
+                    },
+                }
+                for server_name, tools in all_tools.items()
+                for tool in tools
+            ]
+        return self._openai_tools_cache
+
     def _find_tool_server(
         self, tool_name: str, all_tools: Dict[str, List[Any]]
     ) -> Optional[str]:
@@ -178,16 +390,85 @@ class MCPClient:
 
         Args:
             tool_name (str): 工具名称
-            all_tools (Dict[str, List[Any]]): 所有服务器的工具列表
+            all_tools (Dict[str, List[Any]]): 所有服务器的工具列表，索引失效时用于重建索引
 
         Returns:
             Optional[str]: 找到的服务器名称，未找到返回None
         """
-        for server_name, tools in all_tools.items():
-            for tool in tools:
-                if tool.name == tool_name:
-                    return server_name
-        return None
+        if self._tool_index is None:
+            self._tool_index = self._build_tool_index(all_tools)
+        return self._tool_index.get(tool_name)
+
+    def _get_dispatch(
+        self, all_tools: Dict[str, List[Any]]
+    ) -> Dict[str, Callable[[dict], Awaitable[Any]]]:
+        """获取工具调度表，调用时一次查表即可拿到目标服务器的call_tool
+
+        Args:
+            all_tools (Dict[str, List[Any]]): 所有服务器的工具列表，索引失效时用于重建
+
+        Returns:
+            Dict[str, Callable[[dict], Awaitable[Any]]]: 工具名 -> 只需传入参数的调用函数
+        """
+        if self._dispatch is None:
+            if self._tool_index is None:
+                self._tool_index = self._build_tool_index(all_tools)
+            self._dispatch = {
+                tool_name: partial(self.servers[server_name].call_tool, tool_name)
+                for tool_name, server_name in self._tool_index.items()
+                if server_name in self.servers
+            }
+        return self._dispatch
+
+    async def _call_tool(
+        self, tool_call: Any, all_tools: Dict[str, List[Any]]
+    ) -> Dict[str, Any]:
+        """执行单个工具调用，成功或失败都返回一条tool消息
+
+        Args:
+            tool_call (Any): 大模型返回的工具调用
+            all_tools (Dict[str, List[Any]]): 所有服务器的工具列表
+
+        Returns:
+            Dict[str, Any]: 对应的tool消息
+        """
+        tool_name = tool_call.function.name
+        call = self._get_dispatch(all_tools).get(tool_name)
+
+        if call is not None:
+            server_name = self._tool_index[tool_name]
+            try:
+                tool_args = orjson.loads(tool_call.function.arguments)
+                logger.debug("🔧 工具调用: %s, 参数: %s", tool_name, tool_args)
+                result = await call(tool_args)
+                logger.debug("✅ 工具 %s 在服务器 %s 上执行成功", tool_name, server_name)
+                content = result.content
+            except Exception as e:
+                content = f"工具 {tool_name} 在服务器 {server_name} 上执行失败: {str(e)}"
+                logger.error("❌ %s", content)
+        else:
+            content = f"找不到工具 {tool_name} 对应的服务器"
+            logger.error("❌ %s", content)
+
+        return {"role": "tool", "content": content, "tool_call_id": tool_call.id}
+
+    async def _call_tools(
+        self, tool_calls: List[Any], all_tools: Dict[str, List[Any]]
+    ) -> List[Dict[str, Any]]:
+        """并发执行同一轮的多个工具调用，耗时取决于最慢的一个
+
+        Args:
+            tool_calls (List[Any]): 大模型返回的工具调用列表
+            all_tools (Dict[str, List[Any]]): 所有服务器的工具列表
+
+        Returns:
+            List[Dict[str, Any]]: 与tool_calls顺序一致的tool消息列表
+        """
+        return list(
+            await asyncio.gather(
+                *(self._call_tool(tool_call, all_tools) for tool_call in tool_calls)
+            )
+        )
 
     def show_status(self) -> None:
         """显示所有服务器的连接状态"""
@@ -198,13 +479,16 @@ class MCPClient:
             print("  没有配置任何服务器")
             return
 
+        # 打印的同时统计已连接数量，只遍历一次
+        connected_count = 0
         for name, server in self.servers.items():
-            status = "🟢 已连接" if server.is_connected else "🔴 未连接"
+            if server.is_connected:
+                connected_count += 1
+                status = "🟢 已连接"
+            else:
+                status = "🔴 未连接"
             print(f"  {name}: {status} ({server.url})")
 
-        connected_count = sum(
-            1 for server in self.servers.values() if server.is_connected
-        )
         print(f"\n总计: {connected_count}/{len(self.servers)} 个服务器已连接")
 
     async def _show_tools(self) -> None:
@@ -238,20 +522,8 @@ class MCPClient:
     #     all_tools_by_server = await self.get_all_tools()
     #     # print(all_tools_by_server)
 
-    #     # 合并所有工具为OpenAI格式
-    #     available_tools = []
-    #     for server_name, tools in all_tools_by_server.items():
-    #         for tool in tools:
-    #             available_tools.append(
-    #                 {
-    #                     "type": "function",
-    #                     "function": {
-    #                         "name": tool.name,
-    #                         "description": f"[{server_name}] {tool.description}",
-    #                         "parameters": tool.inputSchema,
-    #                     },
-    #                 }
-    #             )
+    #     # 合并所有工具为OpenAI格式（带缓存，服务器变化时才重建）
+    #     available_tools = self._build_openai_tools(all_tools_by_server)
 
     #     if not available_tools:
     #         print("⚠️ 没有可用的工具可正常使用，无法触发工具调用过程")
@@ -270,54 +542,13 @@ class MCPClient:
 
     #     messages.append(response.choices[0].message)
 
-    #     # 处理工具调用
+    #     # 处理工具调用，同一轮的多个工具调用并发执行
     #     if response.choices[0].message.tool_calls:
-    #         for tool_call in response.choices[0].message.tool_calls:
-    #             tool_name = tool_call.function.name
-    #             tool_args = json.loads(tool_call.function.arguments)
-    #             tool_call_id = tool_call.id
-
-    #             print(f"🔧 工具调用: {tool_name}, 参数: {tool_args}")
-
-    #             # 找到工具对应的服务器
-    #             server_name = self._find_tool_server(tool_name, all_tools_by_server)
-
-    #             if server_name and server_name in self.servers:
-    #                 try:
-    #                     result = await self.servers[server_name].call_tool(
-    #                         tool_name, tool_args
-    #                     )
-    #                     print(f"✅ 工具 {tool_name} 在服务器 {server_name} 上执行成功")
-
-    #                     messages.append(
-    #                         {
-    #                             "role": "tool",
-    #                             "content": result.content,
-    #                             "tool_call_id": tool_call_id,
-    #                         }
-    #                     )
-    #                 except Exception as e:
-    #                     error_msg = f"工具 {tool_name} 在服务器 {server_name} 上执行失败: {str(e)}"
-    #                     print(f"❌ {error_msg}")
-
-    #                     messages.append(
-    #                         {
-    #                             "role": "tool",
-    #                             "content": error_msg,
-    #                             "tool_call_id": tool_call_id,
-    #                         }
-    #                     )
-    #             else:
-    #                 error_msg = f"找不到工具 {tool_name} 对应的服务器"
-    #                 print(f"❌ {error_msg}")
-
-    #                 messages.append(
-    #                     {
-    #                         "role": "tool",
-    #                         "content": error_msg,
-    #                         "tool_call_id": tool_call_id,
-    #                     }
-    #                 )
+    #         messages.extend(
+    #             await self._call_tools(
+    #                 response.choices[0].message.tool_calls, all_tools_by_server
+    #             )
+    #         )
 
     #     # 第二次调用大模型获取最终回复
     #     response = await self.llm.chat.completions.create(
@@ -340,7 +571,7 @@ class MCPClient:
 
     #     while True:
     #         try:
-    #             query = input("\n请输入问题: ").strip()
+    #             query = (await asyncio.to_thread(input, "\n请输入问题: ")).strip()
 
     #             if query.lower() == "quit" or query == "再见":
     #                 break
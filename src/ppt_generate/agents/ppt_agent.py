@@ -1,7 +1,14 @@
 from ppt_generate.agents import MCPClient
+from ppt_generate.utils import ResponseCache
+from functools import partial
 from openai import AsyncOpenAI
+import aiofiles
+import asyncio
+import httpx
 import os
 import re
+import sys
+import time
 from ppt_generate.prompts.system_prompt import (
     PPT_OUTLINE_PROMPT,
     PPT_PAGE_CONTENT_PROMPT,
@@ -9,8 +16,94 @@ from ppt_generate.prompts.system_prompt import (
     PPT_MODIFY_PROMPT,
     PPT_GENERATE_PROMPT,
     PPT_HTML_TEMPLATE_PROMPT,
+    PPT_PAGE_CONTENT_USER_PROMPT,
+    PPT_PAGE_RETHINK_USER_PROMPT,
+    PPT_MODIFY_USER_PROMPT,
+    PPT_GENERATE_USER_PROMPT,
 )
-from typing import List, Dict, Any, Callable, Literal, Optional, AsyncIterable
+from typing import List, Dict, Any, Callable, Awaitable, Optional, Tuple
+
+# 从模型输出中提取大纲和每页内容的正则，模块加载时编译一次
+_OUTLINE_RE = re.compile(r"<outline>(.*?)</outline>", re.DOTALL)
+_PAGE_RE = re.compile(r"<page>(.*?)</page>", re.DOTALL)
+_PAGE_END = "</page>"
+
+# 生成html使用的代码模型
+_HTML_MODEL = "qwen3-coder-plus"
+
+# 回复缓存的有效期（秒）：大纲较稳定缓存一天，每页内容缓存一小时
+_OUTLINE_CACHE_TTL = 24 * 3600
+_CONTENT_CACHE_TTL = 3600
+
+
+class _TokenPrinter:
+    """把流式输出的片段攒起来再写到终端，片段数或间隔达到阈值时才写一次，
+    避免每个token都 print(flush=True) 触发一次系统调用
+
+    Args:
+        max_parts (int, optional): 攒够多少个片段写一次。默认值为64。
+        max_delay (float, optional): 距上次写入超过多少秒写一次。默认值为0.05。
+    """
+
+    def __init__(self, max_parts: int = 64, max_delay: float = 0.05) -> None:
+        self.max_parts = max_parts
+        self.max_delay = max_delay
+        self._parts: List[str] = []
+        self._last_flush = time.monotonic()
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+        if (
+            len(self._parts) >= self.max_parts
+            or time.monotonic() - self._last_flush >= self.max_delay
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self._parts:
+            sys.stdout.write("".join(self._parts))
+            sys.stdout.flush()
+            self._parts.clear()
+        self._last_flush = time.monotonic()
+
+
+# 同一组 (api_key, base_url) 在进程内共用一个客户端及其连接池，
+# 每个 websocket 连接新建的 PPTAgent 不再各自重新握手
+_clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+
+
+def _client_for(api_key: str, base_url: str) -> AsyncOpenAI:
+    """获取 (api_key, base_url) 对应的共享客户端，不存在时创建"""
+    client = _clients.get((api_key, base_url))
+    if client is None:
+        client = _clients[(api_key, base_url)] = _new_client(api_key, base_url)
+    return client
+
+
+async def aclose_clients() -> None:
+    """关闭所有共享的大模型客户端及其连接池，应在进程退出前、不再有 PPTAgent 使用时调用"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.close()
+
+
+def _new_client(api_key: str, base_url: str) -> AsyncOpenAI:
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=50,
+                # 生成间隔可能较长，空闲连接多保留一会儿，避免下一次调用重新握手
+                keepalive_expiry=300,
+            ),
+            # 建连要快速失败；流式生成两个 chunk 之间（尤其是思考阶段）可能间隔较久
+            timeout=httpx.Timeout(120.0, connect=5.0),
+            http2=True,
+        ),
+    )
 
 
 class PPTAgent(MCPClient):
@@ -28,11 +121,20 @@ class PPTAgent(MCPClient):
         model (str, optional): 用于生成PPT的模型名称。默认值为"qwen-plus"。
         temperature (float, optional): 生成文本的温度参数。默认值为0.7。
         max_tokens (int, optional): 生成文本的最大token数。默认值为1000。
+        enable_thinking (bool, optional): 是否开启模型的思考过程。关闭后不再推送思考事件，生成更快。默认值为True。
+        response_cache (Optional[ResponseCache], optional): 回复缓存，传入即表示启用：大纲和每页内容生成时，
+            请求参数（模型、温度、max_tokens、是否思考、消息）完全相同的请求直接复用上次的回复，不再重新采样。
+            默认值为None，不缓存。
+        backpressure (Optional[Callable[[], Awaitable[None]]], optional): 每读取一段流式输出前等待的回调，
+            事件消费方积压过多时借此暂停生成。默认值为None，不等待。
 
     Attributes:
-        ppt_info (Dict[str, Any]): 存储PPT信息的字典，包含大纲和每页内容。
+        ppt_info (Dict[str, Any]): 存储PPT信息的字典，包含大纲、每页内容和生成的html文件路径。
     """
 
+    # 命中缓存时按这个长度切片回放，保持前端逐步显示的效果
+    _REPLAY_CHUNK_SIZE = 64
+
     def __init__(
         self,
         api_key: str = os.getenv("DASHSCOPE_API_KEY", ""),
@@ -40,114 +142,229 @@ class PPTAgent(MCPClient):
         model: str = "qwen-plus",
         temperature: float = 0.7,
         max_tokens: int = 8000,
+        enable_thinking: bool = True,
+        response_cache: Optional[ResponseCache] = None,
+        backpressure: Optional[Callable[[], Awaitable[None]]] = None,
     ) -> None:
+        super().__init__()
         self.api_key: str = api_key
         self.base_url: str = base_url
         self.model: str = model
         self.temperature: float = temperature
         self.max_tokens: int = max_tokens
-        self.llm = AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-        )
+        self.enable_thinking: bool = enable_thinking
+        self.response_cache: Optional[ResponseCache] = response_cache
+        self.backpressure = backpressure
+        self.llm = _client_for(self.api_key, self.base_url)
         # 存储PPT信息
         self.ppt_info: Dict[str, Any] = {
             "query": "",
             "reference_content": "",
             "outline": "",
             "pages": [],
-            "html": "",
+            "html_path": "",
         }
 
-    # 生成PPT大纲与每页主要内容
-    async def generate_ppt_outline(
+    async def _stream_llm(
         self,
-        query: str,
-        reference_content: Optional[str] = None,
+        messages: List[Dict[str, str]],
+        think_stage: Optional[str] = None,
+        answer_stage: Optional[str] = None,
         on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
-    ) -> None:
-        messages = [
-            {"role": "system", "content": PPT_OUTLINE_PROMPT},
-            {
-                "role": "user",
-                "content": f"用户需求：{query}\n参考内容：{reference_content if reference_content else '无'}",
-            },
-        ]
-        self.ppt_info["query"] = query
-        self.ppt_info["reference_content"] = reference_content
+        event_fields: Optional[Dict[str, Any]] = None,
+        on_text: Optional[Callable[[str], None]] = None,
+        model: Optional[str] = None,
+        echo: bool = True,
+        cache_ttl: Optional[float] = None,
+    ) -> str:
+        """
+        流式调用大模型并收集回复，各生成环节共用这一个循环。
+
+        给了think_stage且self.enable_thinking为True时开启思考，先推送think_stage的start/token事件，
+        收到第一段回复时推送think_stage的end和answer_stage的start；否则一开始就推送answer_stage的start。
+        answer_stage的end事件由调用方在处理完回复后自行推送。
+
+        Args:
+            messages (List[Dict[str, str]]): 发送给大模型的消息。
+            think_stage (Optional[str], optional): 思考阶段的事件名，为None时不开启思考。默认值为None。
+            answer_stage (Optional[str], optional): 回复阶段的事件名，为None时不推送事件。默认值为None。
+            on_event (Callable, optional): 事件回调。默认值为None。
+            event_fields (Optional[Dict[str, Any]], optional): 附加到每个事件上的字段，例如反思轮次。默认值为None。
+            on_text (Callable, optional): 每收到一段回复时调用。默认值为None。
+            model (Optional[str], optional): 使用的模型，默认使用self.model。
+            echo (bool, optional): 是否把生成过程打印到终端，多个请求并发时关闭以免输出交错。默认值为True。
+            cache_ttl (Optional[float], optional): 回复缓存的有效期（秒），为None时不使用回复缓存。默认值为None。
+
+        Returns:
+            str: 完整的回复内容。
+        """
+        if not answer_stage:
+            on_event = None
+        if not self.enable_thinking:
+            think_stage = None
+        fields = event_fields or {}
+        model = model or self.model
+
+        cache_key = None
+        if (
+            cache_ttl is not None
+            and self.response_cache is not None
+        ):
+            # 影响回复的请求参数都要放进 key，换了设置不会命中旧的回复
+            cache_key = ResponseCache.make_key(
+                model,
+                repr(self.temperature),
+                str(self.max_tokens),
+                "thinking" if think_stage else "",
+                *(f"{m['role']}\x00{m['content']}" for m in messages),
+            )
+            # sqlite 读写是阻塞调用，放到线程里执行，避免卡住事件循环
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                await self._replay_cached(
+                    cached, answer_stage, on_event, fields, on_text, echo
+                )
+                return cached
 
-        # 流式输出，这个大模型不需要任何工具读取加载，直接流式输出即可
         response = await self.llm.chat.completions.create(
-            model=self.model,
+            model=model,
             max_tokens=self.max_tokens,
             tool_choice="none",
             messages=messages,
             temperature=self.temperature,
             stream=True,
-            extra_body={"enable_thinking": True},
+            **({"extra_body": {"enable_thinking": True}} if think_stage else {}),
         )
 
-        # 收集思考内容
-        reasoning_content = ""
         # 收集回复内容
-        answer_content = ""
+        answer_parts: List[str] = []
         # 回复内容是否开始
         is_answering = False
+        printer = _TokenPrinter()
         # 加一个标签
-        print("<outline_think>")
+        if think_stage:
+            print(f"\n<{think_stage}>")
         if on_event:
-            on_event({"stage": "outline_think", "type": "start"})
+            if think_stage:
+                on_event({"stage": think_stage, "type": "start", **fields})
+            else:
+                on_event({"stage": answer_stage, "type": "start", **fields})
 
         async for chunk in response:
+            if self.backpressure is not None:
+                await self.backpressure()
             if not chunk.choices:
-                print("\nUsage: ")
-                print(chunk.usage)
+                if echo:
+                    printer.flush()
+                    print("\nUsage: ")
+                    print(chunk.usage)
                 continue
 
             delta = chunk.choices[0].delta
-            # 只收集思考内容
-            if (
-                hasattr(delta, "reasoning_content")
-                and delta.reasoning_content is not None
-            ):
-                if not is_answering:
-                    print(delta.reasoning_content, end="", flush=True)
-                reasoning_content += delta.reasoning_content
-                if on_event and not is_answering and delta.reasoning_content:
+            reasoning = getattr(delta, "reasoning_content", None)
+            text = getattr(delta, "content", None)
+            # 思考内容只用于打印和推送事件，不保存
+            if reasoning is not None:
+                if echo and not is_answering:
+                    printer.write(reasoning)
+                if on_event and think_stage and not is_answering and reasoning:
                     on_event(
-                        {
-                            "stage": "outline_think",
-                            "type": "token",
-                            "text": delta.reasoning_content,
-                        }
+                        {"stage": think_stage, "type": "token", "text": reasoning, **fields}
                     )
 
             # 收到content，开始进行回复
-            if hasattr(delta, "content") and delta.content:
+            if text:
                 if not is_answering:
-                    print("\n</outline_think>\n")
-                    # print("<outline_answer>")
                     is_answering = True
-                    if on_event:
-                        on_event({"stage": "outline_think", "type": "end"})
-                        on_event({"stage": "outline_answer", "type": "start"})
-                print(delta.content, end="", flush=True)
-                answer_content += delta.content
+                    if think_stage:
+                        printer.flush()
+                        print(f"\n</{think_stage}>\n")
+                        if on_event:
+                            on_event({"stage": think_stage, "type": "end", **fields})
+                            on_event({"stage": answer_stage, "type": "start", **fields})
+                if echo:
+                    printer.write(text)
+                answer_parts.append(text)
                 if on_event:
                     on_event(
-                        {
-                            "stage": "outline_answer",
-                            "type": "token",
-                            "text": delta.content,
-                        }
+                        {"stage": answer_stage, "type": "token", "text": text, **fields}
                     )
+                if on_text:
+                    on_text(text)
+
+        printer.flush()
+        answer_content = "".join(answer_parts)
+        if cache_key is not None:
+            await asyncio.to_thread(
+                self.response_cache.set, cache_key, answer_content, cache_ttl
+            )
+        return answer_content
 
-        # print("\n</outline_answer>")
+    async def _replay_cached(
+        self,
+        answer_content: str,
+        answer_stage: Optional[str],
+        on_event: Optional[Callable[[Dict[str, Any]], None]],
+        fields: Dict[str, Any],
+        on_text: Optional[Callable[[str], None]],
+        echo: bool,
+    ) -> None:
+        """
+        命中回复缓存时，按与真实生成相同的回复事件顺序把缓存内容切片推送出去（没有思考阶段）
 
-        # 从完整内容中提取大纲部分
-        outline_match = re.search(
-            r"<outline>(.*?)</outline>", answer_content, re.DOTALL
+        Args:
+            answer_content (str): 缓存的回复内容
+            answer_stage (Optional[str]): 回复阶段的事件名
+            on_event (Callable, optional): 事件回调
+            fields (Dict[str, Any]): 附加到每个事件上的字段
+            on_text (Callable, optional): 每推送一段回复时调用
+            echo (bool): 是否打印到终端
+        """
+        if echo:
+            print(answer_content)
+        if on_event:
+            on_event({"stage": answer_stage, "type": "start", **fields})
+        for i in range(0, len(answer_content), self._REPLAY_CHUNK_SIZE):
+            text = answer_content[i : i + self._REPLAY_CHUNK_SIZE]
+            if on_event:
+                on_event(
+                    {"stage": answer_stage, "type": "token", "text": text, **fields}
+                )
+            if on_text:
+                on_text(text)
+            # 让出事件循环，使发送任务能边回放边发送
+            await asyncio.sleep(0)
+            if self.backpressure is not None:
+                await self.backpressure()
+
+    # 生成PPT大纲与每页主要内容
+    async def generate_ppt_outline(
+        self,
+        query: str,
+        reference_content: Optional[str] = None,
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        messages = [
+            {"role": "system", "content": PPT_OUTLINE_PROMPT},
+            {
+                "role": "user",
+                "content": f"用户需求：{query}\n参考内容：{reference_content if reference_content else '无'}",
+            },
+        ]
+        self.ppt_info["query"] = query
+        self.ppt_info["reference_content"] = reference_content
+
+        # 流式输出，这个大模型不需要任何工具读取加载，直接流式输出即可
+        answer_content = await self._stream_llm(
+            messages,
+            think_stage="outline_think",
+            answer_stage="outline_answer",
+            on_event=on_event,
+            cache_ttl=_OUTLINE_CACHE_TTL,
         )
+
+        # 从完整内容中提取大纲部分
+        outline_match = _OUTLINE_RE.search(answer_content)
         if outline_match:
             self.ppt_info["outline"] = outline_match.group(1).strip()
             if on_event:
@@ -184,83 +401,62 @@ class PPTAgent(MCPClient):
         if not self.ppt_info["outline"]:
             raise ValueError("请先生成大纲")
         messages = [
-            {
-                "role": "system",
-                "content": PPT_PAGE_CONTENT_PROMPT + "\n" + self.ppt_info["query"],
-            },
+            {"role": "system", "content": PPT_PAGE_CONTENT_PROMPT},
             {
                 "role": "user",
-                "content": f"大纲内容：{outline}\n参考内容：{self.ppt_info['reference_content']}",
+                "content": PPT_PAGE_CONTENT_USER_PROMPT.format(
+                    query=self.ppt_info["query"],
+                    outline=outline,
+                    reference_content=self.ppt_info["reference_content"],
+                ),
             },
         ]
 
-        # 流式输出，在这里同样不需要调用任何工具
-        response = await self.llm.chat.completions.create(
-            model=self.model,
-            max_tokens=self.max_tokens,
-            tool_choice="none",
-            messages=messages,
-            temperature=self.temperature,
-            stream=True,
-            extra_body={"enable_thinking": True},
-        )
-
-        # 收集思考内容
-        reasoning_content = ""
-        # 收集回复内容
-        answer_content = ""
-        # 回复内容是否开始
-        is_answering = False
-        # 加一个标签
-        print("\n<content_think>")
-        if on_event:
-            on_event({"stage": "content_think", "type": "start"})
-
-        async for chunk in response:
-            if not chunk.choices:
-                print("\nUsage: ")
-                print(chunk.usage)
-                continue
-
-            delta = chunk.choices[0].delta
-            # 只收集思考内容
-            if (
-                hasattr(delta, "reasoning_content")
-                and delta.reasoning_content is not None
-            ):
-                if not is_answering:
-                    print(delta.reasoning_content, end="", flush=True)
-                reasoning_content += delta.reasoning_content
-                if on_event and not is_answering and delta.reasoning_content:
+        # 还没遇到 </page> 的文本片段（只追加，闭合一页时才拼接）、
+        # 已到达文本的末尾几个字符（用于发现跨片段的 </page>），以及已经推送给前端的页数
+        pending_parts: List[str] = []
+        tail = ""
+        page_index = 0
+
+        def _scan_pages(text: str) -> None:
+            # 只在新到达的文本附近查找 </page>，每闭合一页就立即推送
+            nonlocal tail, page_index
+            window = tail + text
+            pending_parts.append(text)
+            if _PAGE_END not in window:
+                tail = window[1 - len(_PAGE_END) :]
+                return
+
+            pending = "".join(pending_parts)
+            pending_parts.clear()
+            end = pending.find(_PAGE_END)
+            while end != -1:
+                end += len(_PAGE_END)
+                page_match = _PAGE_RE.search(pending, 0, end)
+                if page_match:
                     on_event(
                         {
-                            "stage": "content_think",
-                            "type": "token",
-                            "text": delta.reasoning_content,
+                            "stage": "content_page",
+                            "index": page_index,
+                            "page": page_match.group(1).strip(),
                         }
                     )
+                    page_index += 1
+                pending = pending[end:]
+                end = pending.find(_PAGE_END)
+            if pending:
+                pending_parts.append(pending)
+            tail = pending[1 - len(_PAGE_END) :]
 
-            # 收到content，开始进行回复
-            if hasattr(delta, "content") and delta.content:
-                if not is_answering:
-                    print("\n</content_think>\n")
-                    # print("<content_answer>")
-                    is_answering = True
-                    if on_event:
-                        on_event({"stage": "content_think", "type": "end"})
-                        on_event({"stage": "content_answer", "type": "start"})
-                print(delta.content, end="", flush=True)
-                answer_content += delta.content
-                if on_event:
-                    on_event(
-                        {
-                            "stage": "content_answer",
-                            "type": "token",
-                            "text": delta.content,
-                        }
-                    )
-
-            # print("\n</content_answer>")
+        # 流式输出，在这里同样不需要调用任何工具
+        answer_content = await self._stream_llm(
+            messages,
+            think_stage="content_think",
+            answer_stage="content_answer",
+            on_event=on_event,
+            on_text=_scan_pages if on_event else None,
+            cache_ttl=_CONTENT_CACHE_TTL,
+        )
         # 反思过程
         if rethink:
             if on_event:
@@ -270,9 +466,7 @@ class PPTAgent(MCPClient):
             )
 
         # 把通过<page>和</page>包裹的信息解耦出来，每一页一个内容放入self.ppt_info["pages"]中
-        page_content_match = re.findall(
-            r"<page>(.*?)</page>", answer_content, re.DOTALL
-        )
+        page_content_match = _PAGE_RE.findall(answer_content)
         self.ppt_info["pages"] = [page.strip() for page in page_content_match]
         if on_event:
             on_event(
@@ -307,6 +501,22 @@ class PPTAgent(MCPClient):
             str: 重新思考后的页面内容。
 
         """
+        # 各轮之间不变的部分只构建一次：系统消息是常量，已知信息先绑定到模板上，
+        # 每轮只需填入本轮的内容和建议
+        rethink_system = {"role": "system", "content": PPT_PAGE_RETHINK_PROMPT}
+        modify_system = {"role": "system", "content": PPT_MODIFY_PROMPT}
+        rethink_user = partial(
+            PPT_PAGE_RETHINK_USER_PROMPT.format,
+            query=self.ppt_info["query"],
+            outline=self.ppt_info["outline"],
+            reference_content=self.ppt_info["reference_content"],
+        )
+        modify_user = partial(
+            PPT_MODIFY_USER_PROMPT.format,
+            query=self.ppt_info["query"],
+            outline=self.ppt_info["outline"],
+            reference_content=reference_content if reference_content else "",
+        )
 
         for i in range(max_rethink_times):
             # 暂定整体反思，还没有存在pages里面，所以直接提取就好了
@@ -315,101 +525,16 @@ class PPTAgent(MCPClient):
 
             # 1. 先反思给建议，每一轮rethink都重新生成message，防止上下文爆炸
             messages = [
-                {
-                    "role": "system",
-                    "content": PPT_PAGE_RETHINK_PROMPT.format(
-                        query=self.ppt_info["query"],
-                        outline=self.ppt_info["outline"],
-                        reference_content=self.ppt_info["reference_content"],
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": page_content,
-                },
+                rethink_system,
+                {"role": "user", "content": rethink_user(page_content=page_content)},
             ]
-            response = await self.llm.chat.completions.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                tool_choice="none",
-                messages=messages,
-                temperature=self.temperature,
-                stream=True,
-                extra_body={"enable_thinking": True},
+            answer_content = await self._stream_llm(
+                messages,
+                think_stage="rethinking_think",
+                answer_stage="rethinking_answer",
+                on_event=on_event,
+                event_fields={"round": i + 1},
             )
-            # 收集思考内容
-            reasoning_content = ""
-            # 收集回复内容
-            answer_content = ""
-            # 回复内容是否开始
-            is_answering = False
-            # 加一个标签
-            print("\n<rethinking_think>")
-            if on_event:
-                on_event(
-                    {
-                        "stage": "rethinking_think",
-                        "type": "start",
-                        "round": i + 1,
-                    }
-                )
-
-            async for chunk in response:
-                if not chunk.choices:
-                    print("\nUsage: ")
-                    print(chunk.usage)
-                    continue
-
-                delta = chunk.choices[0].delta
-                # 只收集思考内容
-                if (
-                    hasattr(delta, "reasoning_content")
-                    and delta.reasoning_content is not None
-                ):
-                    if not is_answering:
-                        print(delta.reasoning_content, end="", flush=True)
-                    reasoning_content += delta.reasoning_content
-                    if on_event and not is_answering and delta.reasoning_content:
-                        on_event(
-                            {
-                                "stage": "rethinking_think",
-                                "type": "token",
-                                "text": delta.reasoning_content,
-                                "round": i + 1,
-                            }
-                        )
-
-                if hasattr(delta, "content") and delta.content:
-                    if not is_answering:
-                        print("\n</rethinking_think>\n")
-                        # print("<rethinking_answer>")
-                        is_answering = True
-                        if on_event:
-                            on_event(
-                                {
-                                    "stage": "rethinking_think",
-                                    "type": "end",
-                                    "round": i + 1,
-                                }
-                            )
-                            on_event(
-                                {
-                                    "stage": "rethinking_answer",
-                                    "type": "start",
-                                    "round": i + 1,
-                                }
-                            )
-                    print(delta.content, end="", flush=True)
-                    answer_content += delta.content
-                    if on_event:
-                        on_event(
-                            {
-                                "stage": "rethinking_answer",
-                                "type": "token",
-                                "text": delta.content,
-                                "round": i + 1,
-                            }
-                        )
 
             # 判断输出有没有包含“检查通过”，有检查通过就跳出循环
             if "检查通过" in answer_content:
@@ -431,64 +556,23 @@ class PPTAgent(MCPClient):
 
             # 没有检查通过，就得按照建议修改
             messages = [
-                {
-                    "role": "system",
-                    "content": PPT_MODIFY_PROMPT.format(
-                        query=self.ppt_info["query"],
-                        outline=self.ppt_info["outline"],
-                        reference_content=(
-                            reference_content if reference_content else ""
-                        ),
-                        modify_advice=answer_content,
-                    ),
-                },
+                modify_system,
                 {
                     "role": "user",
-                    "content": page_content,
+                    "content": modify_user(
+                        modify_advice=answer_content, page_content=page_content
+                    ),
                 },
             ]
 
             # 3. 再根据建议修改内容，这里就不进行思考了
-            response = await self.llm.chat.completions.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                tool_choice="none",
-                messages=messages,
-                temperature=self.temperature,
-                stream=True,
-            )
-
-            # 收集回复内容
-            answer_content = ""
             print("=" * 20 + "修改内容" + "=" * 20)
-            if on_event:
-                on_event(
-                    {
-                        "stage": "modify_answer",
-                        "type": "start",
-                        "round": i + 1,
-                    }
-                )
-
-            async for chunk in response:
-                if not chunk.choices:
-                    print("\nUsage: ")
-                    print(chunk.usage)
-                    continue
-
-                delta = chunk.choices[0].delta
-                if hasattr(delta, "content") and delta.content:
-                    print(delta.content, end="", flush=True)
-                    answer_content += delta.content
-                    if on_event:
-                        on_event(
-                            {
-                                "stage": "modify_answer",
-                                "type": "token",
-                                "text": delta.content,
-                                "round": i + 1,
-                            }
-                        )
+            answer_content = await self._stream_llm(
+                messages,
+                answer_stage="modify_answer",
+                on_event=on_event,
+                event_fields={"round": i + 1},
+            )
             # 3. 把修改后的内容赋值给page_content，然后继续下一轮循环
             page_content = answer_content
             if on_event:
@@ -502,12 +586,15 @@ class PPTAgent(MCPClient):
 
         return page_content
 
-    async def generate_html(self, output_path: str = "output.html"):
+    async def generate_html(
+        self, output_path: str = "output.html", concurrency: int = 4
+    ):
         """
         根据每页的内容，采用大模型生成html格式的PPT，并保存为文件
 
         Args:
             output_path (str): 输出HTML文件的路径，默认为output.html
+            concurrency (int): 同时生成的页面数量上限，默认为4
         """
         # 读取每一页的内容（数组形式，每个数组是一个json）
         page_content = self.ppt_info["pages"]
@@ -523,107 +610,95 @@ class PPTAgent(MCPClient):
             },
         ]
 
-        # 一页一页生成，首先前提就是要形成一个html的PPT模板，不包含任何内容
-        response = await self.llm.chat.completions.create(
-            model="qwen3-coder-plus",
-            max_tokens=self.max_tokens,
-            tool_choice="none",
-            messages=messages,
-            temperature=self.temperature,
-            stream=True,
-        )
-
-        answer_content = ""
+        # 首先前提就是要形成一个html的PPT模板，不包含任何内容
         print("=" * 20 + "html模板生成" + "=" * 20)
-        # 收集回复内容
-        async for chunk in response:
-            if not chunk.choices:
-                print("\nUsage: ")
-                print(chunk.usage)
-                continue
-
-            delta = chunk.choices[0].delta
-            if hasattr(delta, "content") and delta.content:
-                print(delta.content, end="", flush=True)
-                answer_content += delta.content
+        css_template = await self._stream_llm(messages, model=_HTML_MODEL)
 
-        full_html = answer_content
-        css_template = answer_content
+        # 各页之间互不依赖，共用同一个模板，并发生成
+        sem = asyncio.Semaphore(concurrency)
 
-        # 现在一页一页来生成html
-        for page_num, page in enumerate(page_content):
-            page_html = ""
+        async def _render_page(page_num: int, page: str) -> str:
+            # css模板放在用户消息开头，同一次生成的各页请求前缀一致
             messages = [
-                {
-                    "role": "system",
-                    "content": PPT_GENERATE_PROMPT.format(css_template=css_template),
-                },
+                {"role": "system", "content": PPT_GENERATE_PROMPT},
                 {
                     "role": "user",
-                    "content": "用户的需求为：{}，这一页的内容为：{}".format(
-                        self.ppt_info["query"], page
+                    "content": PPT_GENERATE_USER_PROMPT.format(
+                        css_template=css_template,
+                        query=self.ppt_info["query"],
+                        page=page,
                     ),
                 },
             ]
-
-            response = await self.llm.chat.completions.create(
-                model="qwen3-coder-plus",
-                max_tokens=self.max_tokens,
-                tool_choice="none",
-                messages=messages,
-                temperature=self.temperature,
-                stream=True,
-            )
-
-            # 收集回复内容
-            print("=" * 20 + "正在生成第{}页的html代码".format(page_num) + "=" * 20)
-
-            async for chunk in response:
-                if not chunk.choices:
-                    print("\nUsage: ")
-                    print(chunk.usage)
-                    continue
-
-                delta = chunk.choices[0].delta
-                if hasattr(delta, "content") and delta.content:
-                    print(delta.content, end="", flush=True)
-                    page_html += delta.content
-
-                # 检查如果以```html开头，则删除，如果已```结尾也删除
-                if page_html.startswith("```html"):
-                    page_html = page_html[7:]
-                if page_html.endswith("```"):
-                    page_html = page_html[:-3]
-
-            full_html += page_html
-
-        # 加最后一个</html>标签
-        full_html += "</html>"
-
-        # 保存完整的HTML内容到文件
+            async with sem:
+                # 并发生成时逐字打印会交错，整页生成完再一次性打印
+                page_html = await self._stream_llm(
+                    messages, model=_HTML_MODEL, echo=False
+                )
+            print("=" * 20 + "第{}页的html代码".format(page_num) + "=" * 20)
+            print(page_html)
+
+            # 检查如果以```html开头，则删除，如果已```结尾也删除
+            if page_html.startswith("```html"):
+                page_html = page_html[7:]
+            if page_html.endswith("```"):
+                page_html = page_html[:-3]
+            return page_html
+
+        # 所有页面同时开始生成，按页序依次等待：前面的页完成后立即写入文件，
+        # 不必等到最后一页生成完才看到结果。内存中不再保留整份html。
+        # 先写到临时文件，全部成功后再替换，失败时不会覆盖上一次完整的输出
+        tasks = [
+            asyncio.create_task(_render_page(page_num, page))
+            for page_num, page in enumerate(page_content)
+        ]
+        tmp_path = output_path + ".tmp"
         try:
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(full_html)
+            async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+                await f.write(css_template)
+                for task in tasks:
+                    await f.write(await task)
+                # 加最后一个</html>标签
+                await f.write("</html>")
+            os.replace(tmp_path, output_path)
             print(f"\nHTML文件已成功保存到: {output_path}")
-            self.ppt_info["html"] = full_html
+            self.ppt_info["html_path"] = output_path
         except Exception as e:
-            print(f"保存HTML文件时发生错误: {str(e)}")
+            print(f"生成或保存HTML文件时发生错误: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
             raise
+        finally:
+            # 出错时不再继续生成剩下的页面；等待所有任务真正结束，
+            # 被取消或失败的任务的异常在这里取走，不会留下未处理的异常日志
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
 
 async def main():
-    ppt_agent = PPTAgent()
+    # 设置 PPT_RESPONSE_CACHE 为 sqlite 文件路径时启用回复缓存，相同的请求直接复用上次的回复
+    cache_path = os.getenv("PPT_RESPONSE_CACHE")
+    response_cache = ResponseCache(cache_path) if cache_path else None
+    ppt_agent = PPTAgent(response_cache=response_cache)
     query = "生成一个关于Python的PPT，主题内容不超过5页"
     reference_content = (
         "Python是一种高级编程语言，被广泛应用于数据分析、人工智能、Web开发等领域。"
     )
-    await ppt_agent.generate_ppt_outline(query, reference_content)
-    await ppt_agent.generate_page_content(
-        outline=ppt_agent.ppt_info["outline"],
-        rethink=True,
-        max_rethink_times=1,
-    )
-    await ppt_agent.generate_html()
+    try:
+        await ppt_agent.generate_ppt_outline(query, reference_content)
+        await ppt_agent.generate_page_content(
+            outline=ppt_agent.ppt_info["outline"],
+            rethink=True,
+            max_rethink_times=1,
+        )
+        await ppt_agent.generate_html()
+    finally:
+        await aclose_clients()
+        if response_cache is not None:
+            response_cache.close()
 
     # print("\n生成完成，完整内容为：")
     # print(ppt_agent.ppt_info["outline"])
@@ -632,6 +707,6 @@ async def main():
 
 
 if __name__ == "__main__":
-    import asyncio
+    import uvloop
 
-    asyncio.run(main())
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop)
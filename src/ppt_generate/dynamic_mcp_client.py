@@ -1,51 +1,63 @@
 import asyncio
-import json
+import bisect
+import hashlib
+import os
 import time
-from typing import Dict, List, Any, Optional, Callable
-from dataclasses import dataclass, asdict
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Callable, Set, Tuple
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 import aiohttp
 import logging
+import msgspec
+import orjson
+from watchfiles import awatch
 from config_multi_mcp_client import ConfigurableMCPClient, ServerConfig
 
 
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class ServerRegistration:
-    """服务器注册信息
+    """服务器注册信息，字段不可重新赋值，需要变更时用 dataclasses.replace 生成新对象。
+    metadata 是普通字典，只冻结了引用，不要原地修改。按对象身份比较和哈希
+    （索引中也按身份查找），不按字段值比较
 
     Arg:
         name (str): 服务器名称
         url (str): 服务器URL
         description (str, optional): 服务器描述. Defaults to "".
-        tags (List[str], optional): 服务器标签. Defaults to None.
+        tags (Tuple[str, ...], optional): 服务器标签. Defaults to ().
         priority (int, optional): 服务器优先级. Defaults to 0.
         auto_connect (bool, optional): 是否自动连接. Defaults to True.
         health_check_url (Optional[str], optional): 健康检查URL. Defaults to None.
-        metadata (Dict[str, Any], optional): 元数据. Defaults to None.
-        registered_at (float, optional): 注册时间. Defaults to None.
-        last_seen (float, optional): 服务器最后一次活跃的时间戳. Defaults to None.
+        metadata (Dict[str, Any], optional): 元数据. Defaults to {}.
+        registered_at (float, optional): 注册时间. Defaults to 当前时间.
+        last_seen (float, optional): 服务器最后一次活跃的时间戳. Defaults to 当前时间.
     """
 
     name: str
     url: str
     description: str = ""
-    tags: List[str] = None
+    tags: Tuple[str, ...] = ()
     priority: int = 0  # 优先级，数字越大优先级越高
     auto_connect: bool = True
     health_check_url: Optional[str] = None
-    metadata: Dict[str, Any] = None
-    registered_at: float = None
-    last_seen: float = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    registered_at: float = field(default_factory=time.time)
+    last_seen: float = field(default_factory=time.time)
 
-    def __post_init__(self):
-        if self.tags is None:
-            self.tags = []
-        if self.metadata is None:
-            self.metadata = {}
-        if self.registered_at is None:
-            self.registered_at = time.time()
-        if self.last_seen is None:
-            self.last_seen = time.time()
+
+def _neg_priority(registration: ServerRegistration) -> int:
+    return -registration.priority
+
+
+class _RegistryFile(msgspec.Struct):
+    """注册文件的结构，msgspec 直接在 ServerRegistration 与 JSON 字节之间转换，不经过中间字典"""
+
+    servers: Dict[str, ServerRegistration] = {}
+
+
+_registry_encoder = msgspec.json.Encoder()
+_registry_decoder = msgspec.json.Decoder(_RegistryFile)
 
 
 class ServiceRegistry:
@@ -53,13 +65,31 @@ class ServiceRegistry:
 
     Args:
         registry_file (Optional[str], optional): 注册文件路径. Defaults to None.
+        flush_interval (float, optional): 在事件循环中运行时，注册信息变更后最多延迟多少秒写入文件，
+            期间的多次变更合并为一次写入. Defaults to 1.0.
     """
 
-    def __init__(self, registry_file: Optional[str] = None):
+    def __init__(self, registry_file: Optional[str] = None, flush_interval: float = 1.0):
         # 服务注册信息
         self.registrations: Dict[str, ServerRegistration] = {}
         # 注册文件
         self.registry_file = registry_file
+        # 延迟写入：是否有未保存的变更，以及已安排的写入任务
+        self.flush_interval = flush_interval
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+        # 写文件在线程中进行，同一时间只允许一次写入
+        self._write_lock = asyncio.Lock()
+        # 上一次写入（或加载）的文件内容摘要，内容没变时跳过写入
+        self._last_digest: Optional[bytes] = None
+        # 标签倒排索引：标签 -> 带有该标签的服务器名称
+        self._by_tag: Dict[str, Set[str]] = defaultdict(set)
+        # 按优先级从高到低维护的有序列表，注册/注销时插入或移除，查询时无需再排序
+        self._by_priority: List[ServerRegistration] = []
+        # get_servers 的查询结果缓存，注册信息变化时清空
+        self._servers_cache: Dict[
+            Tuple[Tuple[str, ...], int, Optional[int]], List[ServerRegistration]
+        ] = {}
         # 注册回调
         self.callbacks: Dict[str, List[Callable]] = {
             "register": [],
@@ -85,19 +115,20 @@ class ServiceRegistry:
             old_registration = self.registrations.get(registration.name, None)
             if old_registration:
                 # 更新现有注册信息
+                self._unindex(old_registration)
                 self.registrations[registration.name] = registration
                 event = "update"
             else:
                 # 新增注册信息
                 self.registrations[registration.name] = registration
                 event = "register"
+            self._index(registration)
 
             # 触发回调
             self._trigger_callbacks(event, registration)
 
             # 保存到文件
-            if self.registry_file:
-                self.save_registry()
+            self._mark_dirty()
 
             logging.info(f"服务器 {registration.name} 注册成功")
             return True
@@ -118,13 +149,13 @@ class ServiceRegistry:
         try:
             if server_name in self.registrations:
                 registration = self.registrations.pop(server_name)
+                self._unindex(registration)
 
                 # 触发回调
                 self._trigger_callbacks("unregister", registration)
 
                 # 保存到文件
-                if self.registry_file:
-                    self.save_registry()
+                self._mark_dirty()
 
                 logging.info(f"服务器 {server_name} 注销成功")
                 return True
@@ -137,30 +168,82 @@ class ServiceRegistry:
             return False
 
     def get_servers(
-        self, tags: List[str] = None, priority_threshold: int = 0
+        self,
+        tags: List[str] = None,
+        priority_threshold: int = 0,
+        limit: Optional[int] = None,
     ) -> List[ServerRegistration]:
-        """获取服务器列表
+        """获取服务器列表，按优先级从高到低排列
 
         Args:
             tags (List[str], optional): 标签列表. Defaults to None.
             priority_threshold (int, optional): 优先级阈值. Defaults to 0.
+            limit (Optional[int], optional): 最多返回的服务器数量. Defaults to None.
 
         Returns:
             List[ServerRegistration]: 服务器列表
         """
-        servers = list(self.registrations.values())
-
-        # 按标签过滤
-        if tags:
-            servers = [s for s in servers if any(tag in s.tags for tag in tags)]
+        cache_key = (
+            tuple(sorted(set(tags))) if tags else (),
+            priority_threshold,
+            limit,
+        )
+        cached = self._servers_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
 
-        # 按优先级过滤
-        servers = [s for s in servers if s.priority >= priority_threshold]
+        # 按标签过滤：通过倒排索引取出带有任一标签的服务器，不再逐个扫描
+        names = (
+            set().union(*(self._by_tag.get(tag, ()) for tag in tags)) if tags else None
+        )
 
-        # 按优先级排序
-        servers.sort(key=lambda x: x.priority, reverse=True)
+        # 有序列表已按优先级排好，低于阈值或数量够了即可停止
+        servers = []
+        for registration in self._by_priority:
+            if registration.priority < priority_threshold:
+                break
+            if names is not None and registration.name not in names:
+                continue
+            servers.append(registration)
+            if limit is not None and len(servers) >= limit:
+                break
 
-        return servers
+        self._servers_cache[cache_key] = servers
+        return list(servers)
+
+    def _index(self, registration: ServerRegistration) -> None:
+        """把服务器加入标签索引和优先级列表"""
+        self._servers_cache.clear()
+        bisect.insort(self._by_priority, registration, key=_neg_priority)
+        for tag in registration.tags:
+            self._by_tag[tag].add(registration.name)
+
+    def _unindex(self, registration: ServerRegistration) -> None:
+        """把服务器从标签索引和优先级列表中移除"""
+        self._servers_cache.clear()
+        i = self._position(registration)
+        if i is not None:
+            del self._by_priority[i]
+        for tag in registration.tags:
+            names = self._by_tag.get(tag)
+            if names is not None:
+                names.discard(registration.name)
+                if not names:
+                    del self._by_tag[tag]
+
+    def _position(self, registration: ServerRegistration) -> Optional[int]:
+        """二分查找服务器在优先级列表中的下标，再在同优先级的区间内按对象身份匹配"""
+        i = bisect.bisect_left(
+            self._by_priority, -registration.priority, key=_neg_priority
+        )
+        while (
+            i < len(self._by_priority)
+            and self._by_priority[i].priority == registration.priority
+        ):
+            if self._by_priority[i] is registration:
+                return i
+            i += 1
+        return None
 
     def update_last_seen(self, server_name: str):
         """更新服务器最后活跃时间
@@ -168,8 +251,20 @@ class ServiceRegistry:
         Args:
             server_name (str): 服务器名称
         """
-        if server_name in self.registrations:
-            self.registrations[server_name].last_seen = time.time()
+        old_registration = self.registrations.get(server_name)
+        if old_registration is not None:
+            registration = replace(old_registration, last_seen=time.time())
+            self.registrations[server_name] = registration
+            # 只有 last_seen 变了，优先级和标签不变：在有序列表和查询缓存里原地替换，
+            # 不必重建索引，也不让查询缓存失效
+            i = self._position(old_registration)
+            if i is not None:
+                self._by_priority[i] = registration
+            for servers in self._servers_cache.values():
+                for j, item in enumerate(servers):
+                    if item is old_registration:
+                        servers[j] = registration
+                        break
 
     def get_stale_servers(self, timeout: int = 300) -> List[str]:
         """获取超时的服务器
@@ -212,23 +307,75 @@ class ServiceRegistry:
             except Exception as e:
                 logging.error(f"回调执行失败: {str(e)}")
 
+    def _mark_dirty(self) -> None:
+        """标记注册信息有变更，在事件循环中时合并到下一次定时写入，否则立即写入"""
+        if not self.registry_file:
+            return
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        """等待 flush_interval 秒后把期间的变更一次性写入文件"""
+        try:
+            await asyncio.sleep(self.flush_interval)
+        finally:
+            # 开始写入后就不再允许被 aflush 取消，避免线程写到一半时释放写锁
+            self._flush_task = None
+        await self.aflush()
+
+    async def aflush(self) -> None:
+        """如果有未保存的变更，立即写入文件。编码和写文件都在线程中执行，不阻塞事件循环"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        async with self._write_lock:
+            if self._dirty:
+                self._dirty = False
+                # 注册信息只在事件循环线程中修改，这里先拷贝一份快照再交给线程编码
+                await asyncio.to_thread(self._write_registry, dict(self.registrations))
+
+    def flush(self) -> None:
+        """如果有未保存的变更，立即同步写入文件，用于没有运行中的事件循环的场景"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._dirty:
+            self._dirty = False
+            self.save_registry()
+
     def save_registry(self):
         """保存注册信息到文件"""
         if not self.registry_file:
             return
+        self._write_registry(self.registrations)
 
-        try:
-            # 转换注册信息为字典
-            registry_data = {
-                "servers": {
-                    name: asdict(registration)
-                    for name, registration in self.registrations.items()
-                }
-            }
+    def _write_registry(self, registrations: Dict[str, ServerRegistration]) -> None:
+        """编码注册信息并写入文件，内容与上次写入相同时跳过
 
-            # 保存到文件
-            with open(self.registry_file, "w", encoding="utf-8") as f:
-                json.dump(registry_data, f, indent=2, ensure_ascii=False)
+        Args:
+            registrations (Dict[str, ServerRegistration]): 要写入的注册信息
+        """
+        try:
+            payload = msgspec.json.format(
+                _registry_encoder.encode(_RegistryFile(registrations)), indent=2
+            )
+            digest = hashlib.blake2b(payload).digest()
+            if digest == self._last_digest:
+                return
+
+            # 保存到文件，输出 UTF-8 字节，中文不转义；
+            # 先写临时文件再替换，写到一半崩溃也不会留下损坏的注册文件
+            tmp_file = f"{self.registry_file}.tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_file, self.registry_file)
+            self._last_digest = digest
 
         except Exception as e:
             logging.error(f"保存注册信息失败: {str(e)}")
@@ -239,13 +386,18 @@ class ServiceRegistry:
             return
 
         try:
-            with open(self.registry_file, "r", encoding="utf-8") as f:
-                registry_data = json.load(f)
-
-            # 转换为ServerRegistration对象
-            for name, data in registry_data.get("servers", {}).items():
-                registration = ServerRegistration(**data)
+            # 解码时直接构造ServerRegistration对象并校验字段类型
+            with open(self.registry_file, "rb") as f:
+                raw = f.read()
+            registry_data = _registry_decoder.decode(raw)
+            self._last_digest = hashlib.blake2b(raw).digest()
+
+            for name, registration in registry_data.servers.items():
+                old_registration = self.registrations.get(name)
+                if old_registration:
+                    self._unindex(old_registration)
                 self.registrations[name] = registration
+                self._index(registration)
 
             logging.info(f"从文件加载了 {len(self.registrations)} 个服务器注册信息")
 
@@ -268,8 +420,16 @@ class ServiceDiscovery:
         self.registry = registry
         self.discovery_tasks: Dict[str, asyncio.Task] = {}
         self.running = False
+        # 所有HTTP轮询共用的会话，复用连接池，避免每次轮询都重新握手
+        self._session: Optional[aiohttp.ClientSession] = None
+        # 会话是否由本实例创建，外部传入的会话由外部负责关闭
+        self._owns_session = False
 
-    async def start_discovery(self, discovery_configs: List[Dict[str, Any]]):
+    async def start_discovery(
+        self,
+        discovery_configs: List[Dict[str, Any]],
+        session: Optional[aiohttp.ClientSession] = None,
+    ):
         """启动服务发现
 
         Args:
@@ -283,8 +443,23 @@ class ServiceDiscovery:
                     'interval': 5  # 每5秒检查一次文件变化
                 }
         ]
+            session (Optional[aiohttp.ClientSession], optional): 外部共享的HTTP会话，不传则自行创建. Defaults to None.
         """
         self.running = True
+        if session is not None:
+            self._session = session
+            self._owns_session = False
+        elif self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=10,
+                enable_cleanup_closed=True,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=10)
+            )
+            self._owns_session = True
 
         for config in discovery_configs:
             # 检查发现类型是否支持
@@ -319,6 +494,10 @@ class ServiceDiscovery:
         await asyncio.gather(*self.discovery_tasks.values(), return_exceptions=True)
         self.discovery_tasks.clear()
 
+        if self._session is not None and self._owns_session:
+            await self._session.close()
+        self._session = None
+
     async def _http_polling_discovery(self, config: Dict[str, Any]):
         """HTTP轮询发现
 
@@ -337,13 +516,12 @@ class ServiceDiscovery:
 
         while self.running:
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            await self._process_discovery_data(data)
-                        else:
-                            logging.warning(f"HTTP发现失败: {response.status}")
+                async with self._session.get(url) as response:
+                    if response.status == 200:
+                        data = await response.json(loads=orjson.loads)
+                        await self._process_discovery_data(data)
+                    else:
+                        logging.warning(f"HTTP发现失败: {response.status}")
 
             except Exception as e:
                 logging.error(f"HTTP轮询发现错误: {str(e)}")
@@ -351,7 +529,7 @@ class ServiceDiscovery:
             await asyncio.sleep(interval)
 
     async def _file_watch_discovery(self, config: Dict[str, Any]):
-        """文件监控发现
+        """文件监控发现，通过 watchfiles 接收文件系统事件（Linux 下为 inotify），不再定时轮询
 
         Args:
             config (Dict[str, Any]): 发现配置
@@ -360,30 +538,59 @@ class ServiceDiscovery:
                     'type': 'file_watch',
                     'name': 'local_file_discovery',
                     'file_path': 'examples/discovered_servers.json',
-                    'interval': 5  # 每5秒检查一次文件变化
+                    'interval': 5,  # 仅在轮询模式下使用，每5秒检查一次文件变化
+                    'debounce': 0.2,  # 0.2秒内的多次变化合并为一次重新加载
+                    'force_polling': False  # 网络文件系统等收不到事件时改为轮询
                 }
         """
-        file_path = config["file_path"]
+        path = Path(config["file_path"]).resolve()
         interval = config.get("interval", 10)
-        last_modified = 0
+        debounce = config.get("debounce", 0.2)
 
+        # 监听所在目录而不是文件本身：编辑器常用“写临时文件再重命名”的方式保存，
+        # 直接监听文件会在替换后丢失后续事件
+        target = str(path)
+        # 目录不存在或监听出错时按指数退避重试，最长间隔为 interval
+        backoff = 0.5
         while self.running:
+            if not path.parent.is_dir():
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, interval)
+                continue
             try:
-                path = Path(file_path)
+                # 每次（重新）开始监听前先加载一次已有内容
                 if path.exists():
-                    current_modified = path.stat().st_mtime
-                    if current_modified > last_modified:
-                        last_modified = current_modified
-
-                        with open(file_path, "r", encoding="utf-8") as f:
-                            data = json.load(f)
-
-                        await self._process_discovery_data(data)
-
+                    await self._load_discovery_file(path)
+                backoff = 0.5
+                async for _ in awatch(
+                    path.parent,
+                    watch_filter=lambda change, changed: changed == target,
+                    debounce=int(debounce * 1000),
+                    recursive=False,
+                    force_polling=config.get("force_polling"),
+                    poll_delay_ms=int(interval * 1000),
+                ):
+                    if not self.running:
+                        return
+                    if path.exists():
+                        await self._load_discovery_file(path)
             except Exception as e:
                 logging.error(f"文件监控发现错误: {str(e)}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, interval)
 
-            await asyncio.sleep(interval)
+    async def _load_discovery_file(self, path: Path):
+        """读取发现文件并注册其中的服务器
+
+        Args:
+            path (Path): 发现文件路径
+        """
+        try:
+            with open(path, "rb") as f:
+                data = orjson.loads(f.read())
+            await self._process_discovery_data(data)
+        except Exception as e:
+            logging.error(f"文件监控发现错误: {str(e)}")
 
     async def _multicast_discovery(self, config: Dict[str, Any]):
         """组播发现（简化实现）
@@ -428,7 +635,7 @@ class ServiceDiscovery:
                     name=server_data["name"],
                     url=server_data["url"],
                     description=server_data.get("description", ""),
-                    tags=server_data.get("tags", []),
+                    tags=tuple(server_data.get("tags", ())),
                     priority=server_data.get("priority", 0),
                     auto_connect=server_data.get("auto_connect", True),
                     health_check_url=server_data.get("health_check_url"),
@@ -451,6 +658,7 @@ class DynamicMCPClient(ConfigurableMCPClient):
         registry_file: Optional[str] = None,
         api_key: str = None,
         base_url: str = None,
+        max_concurrent_probes: int = 64,
     ):
         super().__init__(config_file, api_key, base_url)
 
@@ -461,19 +669,36 @@ class DynamicMCPClient(ConfigurableMCPClient):
         # 健康检查任务
         self.health_check_task: Optional[asyncio.Task] = None
         self.cleanup_task: Optional[asyncio.Task] = None
+        # 限制同时进行的健康检查数量，服务器很多时避免一次打开过多连接
+        self._probe_sem = asyncio.Semaphore(max_concurrent_probes)
+        # 服务发现轮询与健康检查共用的HTTP会话，首次使用时在事件循环中创建
+        self._http: Optional[aiohttp.ClientSession] = None
 
         # 设置回调
         self.registry.add_callback("register", self._on_server_registered)
         self.registry.add_callback("unregister", self._on_server_unregistered)
         self.registry.add_callback("update", self._on_server_updated)
 
+    def _get_http(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话，不存在或已关闭时新建"""
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=64, ttl_dns_cache=300, keepalive_timeout=60
+                ),
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+        return self._http
+
     async def start_dynamic_features(
         self, discovery_configs: List[Dict[str, Any]] = None
     ):
         """启动动态功能"""
         # 启动服务发现
         if discovery_configs:
-            await self.discovery.start_discovery(discovery_configs)
+            await self.discovery.start_discovery(
+                discovery_configs, session=self._get_http()
+            )
 
         # 启动健康检查
         self.health_check_task = asyncio.create_task(self._health_check_loop())
@@ -501,6 +726,9 @@ class DynamicMCPClient(ConfigurableMCPClient):
         if tasks:
             await asyncio.gather(*tasks, return_exceptions=True)
 
+        # 写入尚未落盘的注册信息
+        await self.registry.aflush()
+
         logging.info("动态功能已停止")
 
     def register_server_manually(self, registration: ServerRegistration) -> bool:
@@ -528,7 +756,9 @@ class DynamicMCPClient(ConfigurableMCPClient):
 
         for registration in servers:
             if registration.name not in self.servers:
-                self.add_server(registration.name, registration.url)
+                self.add_server(
+                    registration.name, registration.url, registration.priority
+                )
 
             try:
                 await self.connect_server(registration.name)
@@ -542,6 +772,9 @@ class DynamicMCPClient(ConfigurableMCPClient):
         while True:
             try:
                 await asyncio.sleep(60)  # 每分钟检查一次
+                # 没有任何服务器时跳过本轮
+                if not self.servers:
+                    continue
                 await self._perform_health_checks()
             except asyncio.CancelledError:
                 break
@@ -549,22 +782,48 @@ class DynamicMCPClient(ConfigurableMCPClient):
                 logging.error(f"健康检查错误: {str(e)}")
 
     async def _perform_health_checks(self):
-        """执行健康检查"""
-        for name, server in self.servers.items():
-            if server.is_connected:
+        """执行健康检查，所有已连接服务器并发探测，总耗时取决于最慢的一个"""
+        # 先做快照，探测过程中服务器列表可能被回调修改
+        names = [name for name, server in self.servers.items() if server.is_connected]
+        if not names:
+            return
+        # _probe_one 自行处理所有异常，单个服务器失败不会取消同组的其他探测
+        async with asyncio.TaskGroup() as tg:
+            for name in names:
+                tg.create_task(self._probe_one(name))
+
+    async def _probe_one(self, name: str):
+        """探测单个服务器，失败时尝试重连
+
+        Args:
+            name (str): 服务器名称
+        """
+        server = self.servers.get(name)
+        if server is None:
+            return
+        registration = self.registry.registrations.get(name)
+        health_check_url = registration.health_check_url if registration else None
+        async with self._probe_sem:
+            try:
+                if health_check_url:
+                    # 配置了健康检查地址时只发一个HEAD请求，走共享连接池
+                    async with self._get_http().head(
+                        health_check_url, timeout=aiohttp.ClientTimeout(total=2)
+                    ) as response:
+                        response.raise_for_status()
+                else:
+                    # 尝试列出工具来检查连接健康状态，跳过缓存，确保真正访问了服务器
+                    await server.get_tools(refresh=True)
+                self.registry.update_last_seen(name)
+            except Exception as e:
+                logging.warning(f"服务器 {name} 健康检查失败: {str(e)}")
+                # 尝试重连
                 try:
-                    # 尝试列出工具来检查连接健康状态
-                    await server.get_tools()
+                    await self.connect_server(name)
                     self.registry.update_last_seen(name)
-                except Exception as e:
-                    logging.warning(f"服务器 {name} 健康检查失败: {str(e)}")
-                    # 尝试重连
-                    try:
-                        await self.connect_server(name)
-                        self.registry.update_last_seen(name)
-                        logging.info(f"服务器 {name} 重连成功")
-                    except Exception as reconnect_error:
-                        logging.error(f"服务器 {name} 重连失败: {str(reconnect_error)}")
+                    logging.info(f"服务器 {name} 重连成功")
+                except Exception as reconnect_error:
+                    logging.error(f"服务器 {name} 重连失败: {str(reconnect_error)}")
 
     async def _cleanup_loop(self):
         """清理循环"""
@@ -616,7 +875,9 @@ class DynamicMCPClient(ConfigurableMCPClient):
         """自动连接服务器"""
         try:
             if registration.name not in self.servers:
-                self.add_server(registration.name, registration.url)
+                self.add_server(
+                    registration.name, registration.url, registration.priority
+                )
 
             await self.connect_server(registration.name)
             self.registry.update_last_seen(registration.name)
@@ -641,7 +902,9 @@ class DynamicMCPClient(ConfigurableMCPClient):
             self.remove_server(registration.name)
 
             # 重新添加和连接
-            self.add_server(registration.name, registration.url)
+            self.add_server(
+                registration.name, registration.url, registration.priority
+            )
             await self.connect_server(registration.name)
             self.registry.update_last_seen(registration.name)
 
@@ -694,6 +957,9 @@ class DynamicMCPClient(ConfigurableMCPClient):
         """清理资源"""
         await self.stop_dynamic_features()
         await super().cleanup()
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
 
 
 # 使用示例
@@ -717,7 +983,7 @@ async def dynamic_example():
                 name="dynamic_weather",
                 url="http://localhost:9001",
                 description="动态注册的天气服务",
-                tags=["weather", "api"],
+                tags=("weather", "api"),
                 priority=10,
                 auto_connect=True,
             )
@@ -728,7 +994,7 @@ async def dynamic_example():
                 name="dynamic_calculator",
                 url="http://localhost:9002",
                 description="动态注册的计算服务",
-                tags=["math", "calculator"],
+                tags=("math", "calculator"),
                 priority=5,
                 auto_connect=False,  # 手动连接
             )
@@ -768,4 +1034,6 @@ async def dynamic_example():
 
 
 if __name__ == "__main__":
-    asyncio.run(dynamic_example())
+    import uvloop
+
+    asyncio.run(dynamic_example(), loop_factory=uvloop.new_event_loop)
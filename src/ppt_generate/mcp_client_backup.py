@@ -3,7 +3,8 @@ from mcp import ClientSession
 from typing import Optional
 from openai import AsyncOpenAI
 import os
-import json
+import orjson
+import asyncio
 
 
 class MCPClient:
@@ -84,7 +85,7 @@ class MCPClient:
                 tool_args = tool_call.function.arguments
                 tool_call_id = tool_call.id
                 # 解析tool_args，是json字符串，需要转换为字典
-                tool_args = json.loads(tool_args)
+                tool_args = orjson.loads(tool_args)
                 print(f"工具调用：{tool_name}, 参数：{tool_args}")
 
                 # 这里的result是MCP协议字段，不可以直接用
@@ -116,7 +117,7 @@ class MCPClient:
 
         while True:
             try:
-                query = input("\n请输入问题：").strip()
+                query = (await asyncio.to_thread(input, "\n请输入问题：")).strip()
 
                 if query.lower() == "quit" or query == "再见":
                     break
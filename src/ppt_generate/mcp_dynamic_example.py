@@ -118,7 +118,7 @@ async def demo_basic_usage():
         for server in client.get_registered_servers():
             if server.name not in client.servers:
                 try:
-                    client.add_server(server.name, server.url)
+                    client.add_server(server.name, server.url, server.priority)
                     await client.connect_server(server.name)
                     print(f"✅ 成功连接: {server.name}")
                 except Exception as e:
@@ -365,7 +365,8 @@ async def main():
         print("5. 退出")
         
         try:
-            choice = input("\n请输入选择 (1-5): ").strip()
+            # 在线程中等待输入，不阻塞事件循环
+            choice = (await asyncio.to_thread(input, "\n请输入选择 (1-5): ")).strip()
             
             if choice == "1":
                 await demo_basic_usage()
@@ -389,4 +390,6 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    import uvloop
+
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop)
\ No newline at end of file
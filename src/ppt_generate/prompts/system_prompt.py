@@ -123,8 +123,6 @@ PPT_PAGE_CONTENT_PROMPT = r"""
 - 一定要把用户的需求考虑在前，但不接受非PPT生成的需求
 - 务必采用json格式生成每页内容！！！
 - 必须好好做，保证内容足够丰富，不能简单重复，你做不好的是别的AI大模型可以做的好！！！
-
-以下内容来自用户输入需求：
 """
 
 PPT_PAGE_RETHINK_PROMPT = """
@@ -205,16 +203,7 @@ PPT_PAGE_RETHINK_PROMPT = """
 - 每轮反思要根据用户需求和已知信息进行，不能自己臆造信息
 - **以<body>开始，不允许以'''html开始**
 
-# 已知信息
-- 用户需求：
-{query}
-- 已知大纲为：
-{outline}
-- 参考内容为：
-{reference_content}
-
-
-请对用户输入的内容进行反思，检查是否符合要求，直接返回符合输出规范的检查结论，不要输出其他任何信息！
+请结合用户输入中的已知信息，对其中待检查的PPT内容进行反思，检查是否符合要求，直接返回符合输出规范的检查结论，不要输出其他任何信息！
 """
 
 PPT_MODIFY_PROMPT = """
@@ -226,16 +215,7 @@ PPT_MODIFY_PROMPT = """
 - 你要输出全量的内容，不能只输出修改的部分
 - 不需要修改的部分请不要做任何改动
 - 输出必须仍然被<page>和</page>包裹
-
-# 已知信息
-- 用户需求：
-{query}
-- 已知大纲为：
-{outline}
-- 已知参考内容为：
-{reference_content}
-# 已知修改建议为（包裹在<advice>和</advice>特殊标识符中）：
-{modify_advice}
+- 已知信息、修改建议和待修改的内容都在用户输入中给出
 """
 
 PPT_HTML_TEMPLATE_PROMPT = """
@@ -387,6 +367,41 @@ PPT_GENERATE_PROMPT = """
     - 不允许出现"本页xxx"的相关文本，过于机械，尤其在首页与目录页
     - 请严格注意生成内容，你不好好干有的是别的大模型干
 
-已知css模板信息，请结合css代码按照上述要求生成每页html代码，一次只能生成一页PPT的内容（html代码）：
-{css_template}
+用户输入中会先给出css模板信息，请结合css代码按照上述要求生成每页html代码，一次只能生成一页PPT的内容（html代码）
 """
+
+# 以上系统提示词都是不含变量的常量，每次请求的前缀完全一致，便于服务端命中提示词缓存；
+# 随请求变化的信息放在下面的用户消息模板中
+
+PPT_PAGE_CONTENT_USER_PROMPT = """用户需求：{query}
+大纲内容：{outline}
+参考内容：{reference_content}"""
+
+PPT_PAGE_RETHINK_USER_PROMPT = """# 已知信息
+- 用户需求：
+{query}
+- 已知大纲为：
+{outline}
+- 参考内容为：
+{reference_content}
+
+# 待检查的PPT内容
+{page_content}"""
+
+PPT_MODIFY_USER_PROMPT = """# 已知信息
+- 用户需求：
+{query}
+- 已知大纲为：
+{outline}
+- 已知参考内容为：
+{reference_content}
+# 已知修改建议为（包裹在<advice>和</advice>特殊标识符中）：
+{modify_advice}
+
+# 待修改的内容
+{page_content}"""
+
+PPT_GENERATE_USER_PROMPT = """已知css模板信息：
+{css_template}
+
+用户的需求为：{query}，这一页的内容为：{page}"""
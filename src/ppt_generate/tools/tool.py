@@ -1,12 +1,14 @@
 # 构建必要的MCP工具，供Cursor或Langgraph智能体使用
 
+import asyncio
 import os
 import logging
 from typing import Optional, Dict, Any
 from pathlib import Path
-import PyPDF2
+import pypdfium2 as pdfium
 from sympy import symbols, simplify, latex
 from datetime import datetime
+from ppt_generate.utils import PDFIUM_LOCK
 
 
 async def web_search(query: str) -> str:
@@ -39,6 +41,21 @@ async def pdf_to_text(
             "error": str (如果失败)
         }
     """
+    return await asyncio.to_thread(_pdf_to_text, pdf_path, start_page, end_page)
+
+
+def _pdf_to_text(
+    pdf_path: str, start_page: Optional[int], end_page: Optional[int]
+) -> Dict[str, Any]:
+    # PDFium 解析是同步的 C 调用，由 pdf_to_text 放到线程中执行，整个解析过程持有
+    # 进程内共享的 PDFium 锁，与后端的文件抽取互斥
+    with PDFIUM_LOCK:
+        return _pdf_to_text_locked(pdf_path, start_page, end_page)
+
+
+def _pdf_to_text_locked(
+    pdf_path: str, start_page: Optional[int], end_page: Optional[int]
+) -> Dict[str, Any]:
     try:
         # 检查文件是否存在
         if not os.path.exists(pdf_path):
@@ -51,9 +68,9 @@ async def pdf_to_text(
             }
 
         # 打开PDF文件
-        with open(pdf_path, "rb") as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            total_pages = len(pdf_reader.pages)
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            total_pages = len(pdf)
 
             # 设置页码范围
             if start_page is None:
@@ -73,20 +90,26 @@ async def pdf_to_text(
 
             # 提取文本
             extracted_text = []
-            pages_processed = 0
 
-            for page_num in range(start_page - 1, end_page):  # PyPDF2使用0基索引
+            for page_num in range(start_page - 1, end_page):  # PDFium使用0基索引
+                try:
+                    page = pdf[page_num]
+                except pdfium.PdfiumError as e:
+                    logging.warning(f"提取第 {page_num + 1} 页时出错: {str(e)}")
+                    continue
                 try:
-                    page = pdf_reader.pages[page_num]
-                    page_text = page.extract_text()
-                    if page_text.strip():  # 只添加非空页面
-                        extracted_text.append(
-                            f"=== 第 {page_num + 1} 页 ===\n{page_text}"
-                        )
-                        pages_processed += 1
-                except Exception as e:
+                    textpage = page.get_textpage()
+                    try:
+                        page_text = textpage.get_text_range().replace("\r\n", "\n")
+                    finally:
+                        textpage.close()
+                except pdfium.PdfiumError as e:
                     logging.warning(f"提取第 {page_num + 1} 页时出错: {str(e)}")
                     continue
+                finally:
+                    page.close()
+                if page_text.strip():  # 只添加非空页面
+                    extracted_text.append(f"=== 第 {page_num + 1} 页 ===\n{page_text}")
 
             full_text = "\n\n".join(extracted_text)
 
@@ -94,9 +117,11 @@ async def pdf_to_text(
                 "success": True,
                 "text": full_text,
                 "total_pages": total_pages,
-                "pages_processed": pages_processed,
+                "pages_processed": len(extracted_text),
                 "error": None,
             }
+        finally:
+            pdf.close()
 
     except Exception as e:
         return {
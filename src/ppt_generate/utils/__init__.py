@@ -1 +1,2 @@
-
+from .response_cache import ResponseCache
+from .pdfium_lock import PDFIUM_LOCK
@@ -0,0 +1,5 @@
+import threading
+
+# PDFium 不是线程安全的：同一进程内所有 pypdfium2 调用（后端文件抽取、pdf_to_text 工具等）
+# 都必须持有这同一把锁，各模块不能各自建锁
+PDFIUM_LOCK = threading.Lock()
@@ -0,0 +1,85 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    基于sqlite的大模型回复缓存，相同的请求（模型、温度、max_tokens、是否思考、消息等参数完全一致）在有效期内直接返回上次的回复，
+    不再调用大模型。适合反复调试同一需求的场景。
+
+    Args:
+        path (str, optional): sqlite数据库文件路径，传入":memory:"时只缓存在内存中。默认值为".ppt_response_cache.sqlite3"。
+    """
+
+    def __init__(self, path: str = ".ppt_response_cache.sqlite3") -> None:
+        self.path = path
+        # 连接可能在事件循环线程以外使用，统一加锁
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """
+        由请求的各个组成部分计算缓存key
+
+        Args:
+            *parts (str): 模型、温度、消息内容等
+
+        Returns:
+            str: sha256十六进制摘要
+        """
+        return hashlib.sha256("\x00".join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存，过期的记录会被顺带删除
+
+        Args:
+            key (str): 缓存key
+
+        Returns:
+            Optional[str]: 缓存的回复，不存在或已过期时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        """
+        写入缓存
+
+        Args:
+            key (str): 缓存key
+            value (str): 回复内容
+            ttl (float): 有效期（秒）
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
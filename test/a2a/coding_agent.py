@@ -1,5 +1,7 @@
 from a2a.server.agent_execution import AgentExecutor
+from functools import lru_cache
 from openai import AsyncOpenAI
+import httpx
 from typing import Literal, Optional, List, AsyncIterable, Dict, Any
 import os
 from a2a.server.agent_execution.context import RequestContext
@@ -9,8 +11,29 @@ from a2a.utils import new_agent_text_message, new_task
 from a2a.types import TaskState, Part, TextPart
 
 
+@lru_cache(maxsize=8)
+def _client_for(api_key: str, base_url: str) -> AsyncOpenAI:
+    """同一组 (api_key, base_url) 在进程内共用一个客户端及其连接池，开启HTTP/2多路复用"""
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            http2=True,
+        ),
+    )
+
+
 # server是专家智能体，基本不用改变智能体原有的逻辑
 class CodingAgent:
+    # 系统提示词在类级别只构建一次，避免每次调用都重新分配
+    _SYSTEM_PROMPT = (
+        {
+            "role": "system",
+            "content": "你是一个代码助手，根据用户的输入，生成对应的代码。注意你只能写代码，遇到不是代码的问题需要你反问用户，让用户明确需求",
+        },
+    )
+
     def __init__(
         self,
         *,
@@ -30,25 +53,14 @@ class CodingAgent:
         self.enable_thinking = enable_thinking
         self.tool_choice = tool_choice
 
-        self.client = AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-        )
+        self.client = _client_for(self.api_key, self.base_url)
 
     async def stream(
         self, messages: List[dict[str, str]]
     ) -> AsyncIterable[Dict[str, Any]]:
-        system_prompt = [
-            {
-                "role": "system",
-                "content": "你是一个代码助手，根据用户的输入，生成对应的代码。注意你只能写代码，遇到不是代码的问题需要你反问用户，让用户明确需求",
-            }
-        ]
-        messages = system_prompt + messages
-
         response = await self.client.chat.completions.create(
             model=self.model,
-            messages=messages,
+            messages=(*self._SYSTEM_PROMPT, *messages),
             temperature=self.temperature,
             max_tokens=self.max_tokens,
             stream=True,  # 代码问题必须流式输出！
@@ -78,12 +90,13 @@ class CodingAgentExecutor(AgentExecutor):
     async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
         # 给request对应的response
 
-        message = {
-            "role": "user" if context.message.role == "user" else "assistant",
-            # "content": context.message.parts[0].root.text,
-            "content": context.get_user_input(),
-        }
-        messages = [message]
+        # A2A的role只有user和agent两种，agent对应OpenAI接口的assistant
+        messages = [
+            {
+                "role": "user" if context.message.role == "user" else "assistant",
+                "content": context.get_user_input(),
+            }
+        ]
 
         # 找到当前任务
         task = context.current_task
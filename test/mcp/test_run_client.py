@@ -1,10 +1,12 @@
 # 测试MCP客户端
 
 import asyncio
+import logging
 from ppt_generate.agents.mcp_client import MCPClient
 
 
 async def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
     client = MCPClient()
     # pdf_to_text
     client.add_server(name="pdf_to_text", url="http://127.0.0.1:8888/mcp")